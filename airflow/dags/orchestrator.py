@@ -10,11 +10,21 @@ from datetime import datetime, timedelta
 # Add project root to path
 sys.path.append('/opt/airflow')
 from src.pipelines.insert_records import main
+from src.pipelines.superset_cache import warm_up_cache
+from src.pipelines.dbt_runner import run_dbt_models
 
 # Get paths from environment or use defaults
 PROJECT_ROOT = os.getenv('PROJECT_ROOT', '/opt/airflow')
 DOCKER_NETWORK = os.getenv('DOCKER_NETWORK', 'weather_data_data_pipeline')
 
+# 'table' or 'materialized_view' (refreshed concurrently, never blocks Superset)
+MART_MATERIALIZATION = os.getenv('DBT_MART_MATERIALIZATION', 'table')
+# 'docker' runs dbt in a fresh container; 'inprocess' runs it inside the
+# Airflow task and only rebuilds models fed by changed sources (requires
+# dbt-postgres in Airflow)
+DBT_TRANSFORM_MODE = os.getenv('DBT_TRANSFORM_MODE', 'docker')
+DBT_COMMAND = f"""run --vars '{{"mart_materialization": "{MART_MATERIALIZATION}"}}'"""
+
 default_args = {
     'owner': 'data_engineer',
     'description': 'Weather data ETL pipeline',
@@ -38,27 +48,39 @@ with dag:
         python_callable=main
     )
 
-    task2 = DockerOperator(
-        task_id='transform_data_task',
-        image='ghcr.io/dbt-labs/dbt-postgres:1.9.latest@sha256:a705312b55af0ebdd149977914c28502a382d74dca8fe51fff368371a61cc8a7',
-        command='run',
-        working_dir='/usr/app/my_project',
-        mounts=[
-            Mount(
-                source=f'{PROJECT_ROOT}/dbt/my_project/',
-                target='/usr/app/my_project',
-                type='bind'
-            ),
-            Mount(
-                source=f'{PROJECT_ROOT}/dbt/profiles.yml',
-                target='/root/.dbt/profiles.yml',
-                type='bind'
-            ),
-        ],
-        network_mode=DOCKER_NETWORK,
-        docker_url='unix://var/run/docker.sock',
-        auto_remove='success'
+    if DBT_TRANSFORM_MODE == 'inprocess':
+        task2 = PythonOperator(
+            task_id='transform_data_task',
+            python_callable=run_dbt_models,
+            op_kwargs={'mart_materialization': MART_MATERIALIZATION}
+        )
+    else:
+        task2 = DockerOperator(
+            task_id='transform_data_task',
+            image='ghcr.io/dbt-labs/dbt-postgres:1.9.latest@sha256:a705312b55af0ebdd149977914c28502a382d74dca8fe51fff368371a61cc8a7',
+            command=DBT_COMMAND,
+            working_dir='/usr/app/my_project',
+            mounts=[
+                Mount(
+                    source=f'{PROJECT_ROOT}/dbt/my_project/',
+                    target='/usr/app/my_project',
+                    type='bind'
+                ),
+                Mount(
+                    source=f'{PROJECT_ROOT}/dbt/profiles.yml',
+                    target='/root/.dbt/profiles.yml',
+                    type='bind'
+                ),
+            ],
+            network_mode=DOCKER_NETWORK,
+            docker_url='unix://var/run/docker.sock',
+            auto_remove='success'
+        )
+
+    task3 = PythonOperator(
+        task_id='warm_superset_cache_task',
+        python_callable=warm_up_cache
     )
 
-    task1 >> task2
+    task1 >> task2 >> task3
 
@@ -1,5 +1,6 @@
 import requests
 import json
+from src.pipelines.superset_cache import DATASET_CACHE_TIMEOUT, set_dataset_cache_timeout
 
 # Superset configuration
 SUPERSET_URL = "http://localhost:8088"
@@ -52,11 +53,26 @@ def create_dataset(access_token, csrf_token, table_name, schema="dev", database_
     if response.status_code in [200, 201]:
         dataset_id = response.json()["id"]
         print(f"✓ Dataset created: {table_name} (ID: {dataset_id})")
+        apply_cache_timeout(access_token, csrf_token, dataset_id)
         return dataset_id
     else:
         print(f"✗ Failed to create dataset {table_name}: {response.status_code} - {response.text}")
         return None
 
+# Align dataset result caching with the 5 minute ingestion schedule
+def apply_cache_timeout(access_token, csrf_token, dataset_id, timeout=DATASET_CACHE_TIMEOUT):
+    session = requests.Session()
+    session.headers.update({
+        "Authorization": f"Bearer {access_token}",
+        "X-CSRFToken": csrf_token,
+        "Content-Type": "application/json"
+    })
+
+    if set_dataset_cache_timeout(session, dataset_id, timeout, base_url=SUPERSET_URL):
+        print(f"✓ Cache timeout set to {timeout}s for dataset {dataset_id}")
+    else:
+        print(f"✗ Failed to set cache timeout for dataset {dataset_id}")
+
 # Create chart
 def create_chart(access_token, csrf_token, chart_config):
     url = f"{SUPERSET_URL}/api/v1/chart/"
@@ -0,0 +1,9 @@
+{#
+    Override of the dbt-postgres default so materialized view refreshes never
+    block readers (Superset keeps querying the previous contents while the
+    new ones are built). Requires a unique index on every materialized view,
+    which the mart models declare through their `indexes` config.
+#}
+{% macro postgres__refresh_materialized_view(relation) %}
+    refresh materialized view concurrently {{ relation }}
+{% endmacro %}
@@ -1,6 +1,9 @@
 {{
     config(
-        materialized='table'
+        materialized=var('mart_materialization'),
+        indexes=[
+            {'columns': ['city', 'weather_date'], 'unique': True}
+        ]
     )
 }}
 
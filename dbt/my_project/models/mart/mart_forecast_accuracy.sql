@@ -0,0 +1,64 @@
+{{
+    config(
+        materialized=var('mart_materialization'),
+        indexes=[
+            {'columns': ['city', 'valid_time', 'issued_at'], 'unique': True}
+        ]
+    )
+}}
+
+-- Forecast vs. observed conditions, per forecast issue and valid hour
+with forecasts as (
+    select
+        city,
+        issued_at,
+        valid_time,
+        horizon_hours,
+        temperature as forecast_temperature,
+        humidity as forecast_humidity,
+        precip as forecast_precip,
+        wind_speed as forecast_wind_speed,
+        chance_of_rain
+    from {{ source('dev', 'raw_weather_forecast') }}
+),
+
+-- Forecast valid times are local wall-clock hours, like local_time
+observations as (
+    select
+        city,
+        date_trunc('hour', local_time) as observed_hour,
+        avg(temperature) as observed_temperature,
+        avg(humidity) as observed_humidity,
+        avg(precip) as observed_precip,
+        avg(wind_speed) as observed_wind_speed,
+        count(*) as observation_count
+    from {{ ref('stg_weather_data') }}
+    where local_time is not null
+    group by city, date_trunc('hour', local_time)
+)
+
+select
+    f.city,
+    f.issued_at,
+    f.valid_time,
+    f.horizon_hours,
+    f.forecast_temperature,
+    o.observed_temperature,
+    f.forecast_temperature - o.observed_temperature as temperature_error,
+    abs(f.forecast_temperature - o.observed_temperature) as temperature_abs_error,
+    f.forecast_humidity,
+    o.observed_humidity,
+    f.forecast_humidity - o.observed_humidity as humidity_error,
+    f.forecast_precip,
+    o.observed_precip,
+    f.forecast_precip - o.observed_precip as precip_error,
+    f.chance_of_rain,
+    f.forecast_wind_speed,
+    o.observed_wind_speed,
+    f.forecast_wind_speed - o.observed_wind_speed as wind_speed_error,
+    o.observation_count
+from forecasts f
+join observations o
+    on o.city = f.city
+    and o.observed_hour = f.valid_time
+order by f.city, f.valid_time desc, f.horizon_hours
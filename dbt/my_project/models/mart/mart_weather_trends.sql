@@ -1,12 +1,16 @@
 {{
     config(
-        materialized='table'
+        materialized=var('mart_materialization'),
+        indexes=[
+            {'columns': ['id'], 'unique': True}
+        ]
     )
 }}
 
 -- Weather trends over time (hourly/recent observations)
 with weather_time_series as (
     select
+        id,
         city,
         temperature,
         feelslike,
@@ -27,6 +31,7 @@ with weather_time_series as (
 )
 
 select
+    id,
     city,
     temperature,
     feelslike,
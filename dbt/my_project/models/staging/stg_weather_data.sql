@@ -1,3 +1,15 @@
+{#
+    dbt rebuilds views by swapping them in and dropping the old copy with
+    CASCADE, which would also drop every materialized view built on top of
+    them. With materialized-view marts, staging is inlined (ephemeral) so
+    the marts depend on the source table only and are refreshed in place.
+#}
+{{
+    config(
+        materialized=('ephemeral' if var('mart_materialization') == 'materialized_view' else 'view')
+    )
+}}
+
 with source as (
     select * from {{ source('dev', 'raw_weather_data') }}
 ),
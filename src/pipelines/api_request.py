@@ -1,6 +1,13 @@
 import os
+import threading
+import time
 import requests
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from src.pipelines.payload import decode_json, decode_payload, payload_get, PayloadValidationError
 
 # Load environment variables
 load_dotenv()
@@ -9,6 +16,23 @@ load_dotenv()
 api_key = os.getenv("WEATHER_API_KEY")
 base_url = os.getenv("WEATHER_API_BASE_URL", "http://api.weatherstack.com/current")
 
+# Secondary provider (weatherapi.com), used for hedged requests and failover
+weatherapi_key = os.getenv("WEATHERAPI_KEY")
+weatherapi_base_url = os.getenv("WEATHERAPI_BASE_URL", "http://api.weatherapi.com/v1/current.json")
+
+# Seconds before an individual provider request is abandoned
+request_timeout = float(os.getenv("WEATHER_API_TIMEOUT", 10))
+
+# Hedge delay used until enough latency samples exist to compute a p95
+default_hedge_after = float(os.getenv("WEATHER_HEDGE_AFTER_MS", 1500)) / 1000
+
+# Account quota of the primary provider, when known (headers can also report it)
+monthly_quota = os.getenv("WEATHER_API_MONTHLY_QUOTA")
+minute_quota = os.getenv("WEATHER_API_MINUTE_QUOTA")
+
+# Retries of a throttled (429) request, each after the advertised back-off
+throttle_retries = int(os.getenv("WEATHER_API_THROTTLE_RETRIES", 2))
+
 def mock_fetch_data(city="New York"):
     """Return mock data for New York to bypass API limits."""
     # Simulated data based on user example
@@ -72,24 +96,470 @@ def mock_fetch_data(city="New York"):
         }
     }
 
-def fetch_data(city):
-    """Fetch weather data for a specific city"""
-    url = f"{base_url}?access_key={api_key}&query={city}"
+class ProviderError(Exception):
+    """Raised when a provider returns an error payload or cannot be reached."""
+
+
+class QuotaExceededError(ProviderError):
+    """Raised when the provider's monthly request quota is used up."""
+
+
+class ThrottledError(ProviderError):
+    """Raised when the provider still throttles (429) after the retries."""
+
+
+def _month_bounds(timestamp):
+    """UTC start and end (epoch seconds) of the month containing timestamp."""
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.timestamp(), end.timestamp()
+
+
+def _header_int(headers, names):
+    for name in names:
+        try:
+            return int(headers.get(name))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class RateLimitScheduler:
+    """Paces requests to one provider according to its account quota.
+
+    The per-minute rate and the monthly quota come from configuration or
+    from rate-limit response headers. Throttling (HTTP/error code 429)
+    halves the request rate and honours Retry-After; every successful
+    response raises it again by a tenth of the limit. Without a known
+    per-minute limit, the rate before throttling is the limit, and pacing
+    is lifted again once it is reached.
+    Error code 104 (monthly usage limit reached) stops all requests until
+    the month rolls over.
+    """
+
+    MINUTE_LIMIT_HEADERS = ("X-RateLimit-Limit-Minute", "X-RateLimit-Limit")
+    MINUTE_REMAINING_HEADERS = ("X-RateLimit-Remaining-Minute", "X-RateLimit-Remaining")
+    MONTH_LIMIT_HEADERS = ("X-RateLimit-Limit-Month", "X-Quota-Limit")
+    MONTH_REMAINING_HEADERS = ("X-RateLimit-Remaining-Month", "X-Quota-Remaining")
+
+    def __init__(self, monthly_quota=None, per_minute=None, clock=time.time, sleep=time.sleep):
+        self.monthly_quota = monthly_quota
+        self.per_minute = per_minute
+        self.rate = per_minute
+        # Rate to recover to after throttling when per_minute is unknown
+        self.ceiling = None
+        self.clock = clock
+        self.sleep = sleep
+        self.period_start, self.period_end = _month_bounds(clock())
+        self.used = 0
+        self.exhausted = False
+        self.blocked_until = 0.0
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def _roll_period(self, now):
+        if now >= self.period_end:
+            self.period_start, self.period_end = _month_bounds(now)
+            self.used = 0
+            self.exhausted = False
+
+    @property
+    def monthly_remaining(self):
+        if self.monthly_quota is None:
+            return None
+        return max(0, self.monthly_quota - self.used)
+
+    def delay(self):
+        """Seconds to wait before the next request is allowed."""
+        now = self.clock()
+        self._roll_period(now)
+        if self.exhausted or self.monthly_remaining == 0:
+            raise QuotaExceededError("monthly request quota reached")
+
+        wait_for = self.blocked_until - now
+        while self.recent and self.recent[0] <= now - 60:
+            self.recent.popleft()
+        if self.rate:
+            if len(self.recent) >= self.rate:
+                wait_for = max(wait_for, self.recent[0] + 60 - now)
+            if self.recent:
+                wait_for = max(wait_for, self.recent[-1] + 60 / self.rate - now)
+        return max(0.0, wait_for)
+
+    def acquire(self):
+        """Block until a request may be sent, then count it against the quota."""
+        with self.lock:
+            wait_for = self.delay()
+            if wait_for > 0:
+                print(f"Rate limit: waiting {wait_for:.1f}s before next API call...")
+                self.sleep(wait_for)
+            self.recent.append(self.clock())
+            self.used += 1
+
+    def observe(self, status_code, headers, data):
+        """Update quota and pacing from a provider response.
+
+        Returns "quota" for a usage limit error, "throttled" for a 429 and
+        None otherwise.
+        """
+        with self.lock:
+            now = self.clock()
+            minute_limit = _header_int(headers, self.MINUTE_LIMIT_HEADERS)
+            if minute_limit:
+                self.per_minute = minute_limit
+                self.rate = min(self.rate or minute_limit, minute_limit)
+            month_limit = _header_int(headers, self.MONTH_LIMIT_HEADERS)
+            if month_limit:
+                self.monthly_quota = month_limit
+            month_remaining = _header_int(headers, self.MONTH_REMAINING_HEADERS)
+            if month_remaining is not None:
+                if self.monthly_quota is None:
+                    self.monthly_quota = self.used + month_remaining
+                self.used = self.monthly_quota - month_remaining
+            if _header_int(headers, self.MINUTE_REMAINING_HEADERS) == 0:
+                self.blocked_until = max(self.blocked_until, now + 60)
+
+            error = None if data is None else payload_get(data, 'error')
+            code = error.get('code') if isinstance(error, dict) else None
+            if code == 104:
+                print("Monthly API quota reached (error 104)")
+                self.exhausted = True
+                return "quota"
+            elif status_code == 429 or code == 429:
+                retry_after = _header_int(headers, ("Retry-After",)) or 60
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+                if self.rate is None:
+                    self.ceiling = max(len(self.recent), 2)
+                self.rate = max(1, (self.rate or self.ceiling) // 2)
+                print(f"Throttled by API, backing off {retry_after}s at {self.rate} requests/minute")
+                return "throttled"
+            elif error is None and self.rate:
+                limit = self.per_minute or self.ceiling
+                if limit and self.rate < limit:
+                    self.rate = min(limit, self.rate + max(1, limit // 10))
+                if self.per_minute is None and self.ceiling and self.rate >= self.ceiling:
+                    self.rate = self.ceiling = None
+
+    def run_budget(self, run_interval_minutes):
+        """Requests this run may make so the monthly quota lasts all month.
+
+        The quota accrues evenly over the month; the budget is what has
+        accrued so far minus what was already used. None when unlimited.
+        """
+        if self.monthly_quota is None:
+            return None
+        now = self.clock()
+        self._roll_period(now)
+        if self.exhausted:
+            return 0
+        elapsed = (now - self.period_start + run_interval_minutes * 60) / (self.period_end - self.period_start)
+        accrued = int(self.monthly_quota * min(1.0, elapsed))
+        return max(0, min(accrued - self.used, self.monthly_remaining))
+
+    def period(self):
+        """First day of the current quota period, for persisting usage."""
+        return datetime.fromtimestamp(self.period_start, tz=timezone.utc).date()
+
+
+class LatencyTracker:
+    """Rolling window of request latencies (seconds) for one provider."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        """Return the pct-th percentile, or None while the window is too small."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class WeatherProvider(ABC):
+    """Base class for a weather API returning payloads in the weatherstack shape.
+
+    Subclasses build the request URL, detect error payloads and normalize the
+    response so `insert_records` can consume any provider unchanged.
+    """
+
+    name = "base"
+
+    def __init__(self, base_url, api_key, timeout=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = request_timeout if timeout is None else timeout
+        self.latency = LatencyTracker()
+        self.scheduler = RateLimitScheduler()
+
+    @abstractmethod
+    def build_url(self, city):
+        """Return the request URL for `city`."""
+
+    def error_message(self, data):
+        """Return the provider error description, or None for a good payload."""
+        return None
+
+    def decode(self, content):
+        """Decode a response body; raises PayloadValidationError for bad JSON."""
+        return decode_json(content)
+
+    def normalize(self, data):
+        return data
+
+    def fetch(self, city):
+        """Fetch and normalize `city`, retrying throttled requests.
+
+        A throttled request is retried up to `throttle_retries` times; the
+        scheduler makes each retry wait for the back-off the API asked for.
+        """
+        for attempt in range(throttle_retries + 1):
+            try:
+                return self._fetch_once(city)
+            except ThrottledError:
+                if attempt == throttle_retries:
+                    raise
+                print(f"Retrying {city} on {self.name} after throttling")
+
+    def _fetch_once(self, city):
+        url = self.build_url(city)
+        self.scheduler.acquire()
+        start = time.perf_counter()
+        try:
+            response = requests.get(url, timeout=self.timeout)
+            # Check the JSON body first (some APIs return 200 even for errors)
+            try:
+                data = self.decode(response.content)
+            except PayloadValidationError:
+                data = None
+            signal = self.scheduler.observe(response.status_code, response.headers, data)
+            if signal == "quota":
+                raise QuotaExceededError(f"{self.name} monthly quota reached while fetching {city}")
+            if signal == "throttled":
+                raise ThrottledError(f"{self.name} throttled the request for {city}")
+            if data is None:
+                response.raise_for_status()
+                raise ProviderError(f"{self.name} returned invalid JSON for {city}")
+            error = self.error_message(data)
+            if error is not None:
+                raise ProviderError(f"API Error from {self.name} for {city}: {error}")
+            response.raise_for_status()
+        except (requests.RequestException, ValueError) as e:
+            raise ProviderError(f"{self.name} request failed for {city}: {e}") from e
+        finally:
+            self.latency.record(time.perf_counter() - start)
+        return self.normalize(data)
+
+
+class WeatherstackProvider(WeatherProvider):
+    """weatherstack.com current conditions; payloads are already in our shape."""
+
+    name = "weatherstack"
+
+    def build_url(self, city):
+        return f"{self.base_url}?access_key={self.api_key}&query={city}"
+
+    def decode(self, content):
+        # Already in our shape, so decode straight into the typed schema
+        return decode_payload(content)
+
+    def error_message(self, data):
+        if payload_get(data, 'success') is False:
+            return payload_get(data, 'error')
+        return None
+
+
+class WeatherAPIProvider(WeatherProvider):
+    """weatherapi.com current conditions, normalized to the weatherstack shape."""
+
+    name = "weatherapi"
+
+    def build_url(self, city):
+        return f"{self.base_url}?key={self.api_key}&q={city}&aqi=yes"
+
+    def error_message(self, data):
+        return data.get('error')
+
+    def normalize(self, data):
+        location = data.get('location', {})
+        current = data.get('current', {})
+        condition = current.get('condition', {})
+
+        observation_time = None
+        if current.get('last_updated_epoch') is not None:
+            observed = datetime.fromtimestamp(current['last_updated_epoch'], tz=timezone.utc)
+            observation_time = observed.strftime("%I:%M %p")
+
+        icon = condition.get('icon')
+        if icon and icon.startswith('//'):
+            icon = f"https:{icon}"
+
+        is_day = current.get('is_day')
+        # weatherapi reports these as decimals; our columns hold integers
+        pressure, uv_index, visibility = (
+            None if current.get(key) is None else round(current[key])
+            for key in ('pressure_mb', 'uv', 'vis_km')
+        )
+        return {
+            "request": {
+                "type": "City",
+                "query": f"{location.get('name')}, {location.get('country')}",
+                "language": "en",
+                "unit": "m"
+            },
+            "location": {
+                "name": location.get('name'),
+                "country": location.get('country'),
+                "region": location.get('region'),
+                "lat": location.get('lat'),
+                "lon": location.get('lon'),
+                "timezone_id": location.get('tz_id'),
+                "localtime": location.get('localtime'),
+                "localtime_epoch": location.get('localtime_epoch'),
+                "utc_offset": None
+            },
+            "current": {
+                "observation_time": observation_time,
+                "temperature": current.get('temp_c'),
+                "weather_code": condition.get('code'),
+                "weather_icons": [icon] if icon else [],
+                "weather_descriptions": [condition['text']] if condition.get('text') else [],
+                "astro": {},
+                "air_quality": current.get('air_quality', {}),
+                "wind_speed": current.get('wind_kph'),
+                "wind_degree": current.get('wind_degree'),
+                "wind_dir": current.get('wind_dir'),
+                "pressure": pressure,
+                "precip": current.get('precip_mm'),
+                "humidity": current.get('humidity'),
+                "cloudcover": current.get('cloud'),
+                "feelslike": current.get('feelslike_c'),
+                "uv_index": uv_index,
+                "visibility": visibility,
+                "is_day": None if is_day is None else ("yes" if is_day else "no")
+            }
+        }
+
+
+# Provider instances are reused so their latency windows survive across calls
+_providers = {}
+
+
+def get_provider(name):
+    """Return the shared provider instance configured from the environment."""
+    if name not in _providers:
+        if name == WeatherstackProvider.name:
+            _providers[name] = WeatherstackProvider(base_url, api_key)
+            _providers[name].scheduler = RateLimitScheduler(
+                monthly_quota=int(monthly_quota) if monthly_quota else None,
+                per_minute=int(minute_quota) if minute_quota else None
+            )
+        elif name == WeatherAPIProvider.name:
+            _providers[name] = WeatherAPIProvider(weatherapi_base_url, weatherapi_key)
+        else:
+            raise ValueError(f"Unknown weather provider: {name}")
+    return _providers[name]
+
+
+def get_providers():
+    """Providers in priority order, from WEATHER_PROVIDERS (comma separated)."""
+    names = os.getenv("WEATHER_PROVIDERS", WeatherstackProvider.name)
+    return [get_provider(name.strip()) for name in names.split(",") if name.strip()]
+
+
+def hedge_threshold(provider):
+    """Seconds to wait on provider before hedging: its observed p95 latency."""
+    p95 = provider.latency.percentile(95)
+    return default_hedge_after if p95 is None else p95
+
+
+def hedged_fetch(city, primary, backup, threshold=None):
+    """Fetch from primary, firing backup if primary is slow or fails.
+
+    The backup request is sent once primary has not answered within
+    `threshold` seconds (its p95 by default) or as soon as primary errors.
+    Whichever successful response arrives first is returned.
+    """
+    if threshold is None:
+        threshold = hedge_threshold(primary)
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        pending = {executor.submit(primary.fetch, city): primary}
+        hedged = False
+        done, _ = wait(pending, timeout=threshold)
+        if not done:
+            print(f"{primary.name} did not answer within {threshold:.2f}s, hedging with {backup.name}")
+            pending[executor.submit(backup.fetch, city)] = backup
+            hedged = True
+
+        errors = []
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    data = future.result()
+                    print(f"Using response from {provider.name} for {city}")
+                    return data
+                except ProviderError as e:
+                    errors.append(e)
+                    if not hedged:
+                        print(f"{provider.name} failed, failing over to {backup.name}")
+                        pending[executor.submit(backup.fetch, city)] = backup
+                        hedged = True
+        message = "; ".join(str(e) for e in errors)
+        if all(isinstance(e, QuotaExceededError) for e in errors):
+            raise QuotaExceededError(message)
+        if any(isinstance(e, ThrottledError) for e in errors):
+            raise ThrottledError(message)
+        raise ProviderError(message)
+    finally:
+        # Do not wait for the slower request; its result is discarded
+        executor.shutdown(wait=False)
+
+
+def fetch_data(city, providers=None, hedge=None):
+    """Fetch weather data for a specific city.
+
+    Uses the first configured provider. When hedging is enabled
+    (WEATHER_HEDGE_ENABLED) and a second provider is configured, a backup
+    request is raced against slow primary responses.
+    """
+    if providers is None:
+        providers = get_providers()
+    if hedge is None:
+        hedge = os.getenv("WEATHER_HEDGE_ENABLED", "false").lower() == "true"
+
     print(f"Fetching data for {city}")
     try:
-        response = requests.get(url)
-        # Check for success field in JSON (API returns 200 even for errors)
-        data = response.json()
-        if data.get('success') is False:
-             print(f"API Error for {city}: {data.get('error')}")
-             print("Falling back to mock data due to API error...")
-             return mock_fetch_data(city)
-             
-        response.raise_for_status()
+        if hedge and len(providers) > 1:
+            data = hedged_fetch(city, providers[0], providers[1])
+        else:
+            data = providers[0].fetch(city)
         print(f"API response received successfully for {city}")
         return data
 
-    except requests.RequestException as e :
+    except (QuotaExceededError, ThrottledError):
+        # Mock data would only mask the outage; let the caller stop or skip
+        raise
+    except ProviderError as e:
         print(f"An error occured {e}")
-        print("Falling back to mock data due to connection error...")
-        return mock_fetch_data(city)
+        print("Falling back to mock data...")
+        data = mock_fetch_data(city)
+        # Tagged so callers do not take it for the weather of `city`
+        data["fallback"] = True
+        return data
+
+
+def is_fallback(data):
+    """True for the mock payload fetch_data substitutes when providers fail."""
+    return isinstance(data, dict) and data.get("fallback") is True
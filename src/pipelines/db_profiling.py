@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+import psycopg2
+import psycopg2.extensions
+
+_COMMENTS = re.compile(r"--[^\n]*")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_TUPLE = r"\((?:[^()]|\([^()]*\))*\)"
+_REPEATED_TUPLES = re.compile(rf"({_TUPLE})(?:\s*,\s*{_TUPLE})+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Statements EXPLAIN ANALYZE can run; DDL and multi-statement scripts are skipped
+_EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+
+
+def fingerprint(query):
+    """Normalize a statement so executions differing only in values group together.
+
+    Returns (normalized text, 12 character hash). Literals become `?` and
+    multi-row VALUES lists collapse to their first row.
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", errors="replace")
+    text = _COMMENTS.sub(" ", query)
+    text = _LITERALS.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    text = _REPEATED_TUPLES.sub(r"\1, ...", text)
+    return text, hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+class QueryProfiler:
+    """Records every statement run through its cursors into a ring buffer.
+
+    Statements slower than `slow_ms` are sampled with
+    `EXPLAIN (ANALYZE, BUFFERS)` when `explain` is set, at most once per
+    fingerprint. The EXPLAIN re-executes the statement inside a savepoint
+    that is rolled back, so writes are not applied twice.
+    """
+
+    def __init__(self, capacity=1000, slow_ms=100, explain=False):
+        self.statements = deque(maxlen=capacity)
+        self.explains = deque(maxlen=max(1, capacity // 10))
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self._explained = set()
+
+    def cursor_factory(self):
+        """Cursor class to pass as `cursor_factory` to psycopg2.connect."""
+        return type("BoundProfilingCursor", (ProfilingCursor,), {"profiler": self})
+
+    def observe(self, cursor, query, seconds, error=None):
+        text, digest = fingerprint(query)
+        duration_ms = seconds * 1000
+        self.statements.append({
+            "fingerprint": digest,
+            "statement": text[:500],
+            "duration_ms": round(duration_ms, 3),
+            "rows": cursor.rowcount,
+            "error": error,
+            "at": time.time(),
+        })
+        if (self.explain and error is None and duration_ms >= self.slow_ms
+                and digest not in self._explained):
+            self._explained.add(digest)
+            self._sample_plan(cursor, digest, duration_ms)
+
+    def _sample_plan(self, cursor, digest, duration_ms):
+        executed = cursor.query
+        if isinstance(executed, bytes):
+            executed = executed.decode("utf-8", errors="replace")
+        statement = (executed or "").strip().rstrip(";")
+        if not statement.lower().startswith(_EXPLAINABLE) or ";" in statement:
+            return
+        if cursor.connection.autocommit and not statement.lower().startswith("select"):
+            # No transaction to roll the re-executed write back in
+            return
+
+        plain = cursor.connection.cursor(cursor_factory=psycopg2.extensions.cursor)
+        in_transaction = not cursor.connection.autocommit
+        try:
+            if in_transaction:
+                plain.execute("SAVEPOINT query_profiler_explain")
+            plain.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}")
+            plan = plain.fetchone()[0]
+            if in_transaction:
+                plain.execute("ROLLBACK TO SAVEPOINT query_profiler_explain")
+        except psycopg2.Error as e:
+            if in_transaction:
+                plain.execute("ROLLBACK TO SAVEPOINT query_profiler_explain")
+            plan = {"error": str(e)}
+        finally:
+            plain.close()
+        self.explains.append({"fingerprint": digest, "duration_ms": round(duration_ms, 3), "plan": plan})
+
+    def summary(self):
+        """Per-fingerprint totals over the buffered statements, slowest first."""
+        totals = {}
+        for record in self.statements:
+            entry = totals.setdefault(record["fingerprint"], {
+                "fingerprint": record["fingerprint"],
+                "statement": record["statement"],
+                "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "errors": 0,
+            })
+            entry["calls"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + record["duration_ms"], 3)
+            entry["max_ms"] = max(entry["max_ms"], record["duration_ms"])
+            entry["rows"] += max(record["rows"] or 0, 0)
+            entry["errors"] += record["error"] is not None
+        return sorted(totals.values(), key=lambda entry: entry["total_ms"], reverse=True)
+
+    def dump(self, path):
+        """Write the summary, buffered statements and plan samples as JSON."""
+        with open(path, "w") as f:
+            json.dump({
+                "summary": self.summary(),
+                "statements": list(self.statements),
+                "explains": list(self.explains),
+            }, f, indent=2, default=str)
+        print(f"DB profile written to {path}")
+
+
+class ProfilingCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor timing each execute/executemany into `profiler`."""
+
+    profiler = None
+
+    def _timed(self, method, query, vars):
+        start = time.perf_counter()
+        try:
+            result = method(query, vars)
+        except psycopg2.Error as e:
+            self.profiler.observe(self, query, time.perf_counter() - start, error=str(e))
+            raise
+        self.profiler.observe(self, query, time.perf_counter() - start)
+        return result
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(super().executemany, query, vars_list)
+
+
+def profiler_from_env():
+    """QueryProfiler configured from DB_PROFILE* variables, or None when disabled."""
+    if os.getenv("DB_PROFILE", "false").lower() != "true":
+        return None
+    return QueryProfiler(
+        capacity=int(os.getenv("DB_PROFILE_CAPACITY", 1000)),
+        slow_ms=float(os.getenv("DB_PROFILE_SLOW_MS", 100)),
+        explain=os.getenv("DB_PROFILE_EXPLAIN", "false").lower() == "true",
+    )
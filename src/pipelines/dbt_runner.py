@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Paths as mounted in the Airflow container
+dbt_project_dir = os.getenv("DBT_PROJECT_DIR", "/opt/airflow/dbt/my_project")
+dbt_profiles_dir = os.getenv("DBT_PROFILES_DIR", "/opt/airflow/dbt")
+
+# Fallback selection when there is no previous freshness state to compare to
+dbt_select = os.getenv("DBT_SELECT", "source:dev.raw_weather_data+ source:dev.raw_weather_forecast+")
+
+# Artifacts of the last successful run, compared against to select changed sources
+dbt_state_dir = os.getenv("DBT_STATE_DIR")
+
+# Parsed manifest, reused by later invocations in the same process. Airflow
+# starts a new process per task, so across DAG runs it is the partial
+# parsing state in target/ that saves the parse, not this cache.
+_runner = None
+_runner_key = None
+
+
+def _load_runner_class():
+    from dbt.cli.main import dbtRunner
+    return dbtRunner
+
+
+def _project_mtime():
+    """Latest modification time of the project files that affect parsing."""
+    latest = os.path.getmtime(os.path.join(dbt_project_dir, "dbt_project.yml"))
+    for folder in ("models", "macros"):
+        for root, _, files in os.walk(os.path.join(dbt_project_dir, folder)):
+            for name in files:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+    return latest
+
+
+def _common_args(dbt_vars):
+    return [
+        "--project-dir", dbt_project_dir,
+        "--profiles-dir", dbt_profiles_dir,
+        "--vars", json.dumps(dbt_vars),
+    ]
+
+
+def get_runner(dbt_vars):
+    """Return a dbtRunner preloaded with the project manifest.
+
+    The manifest is kept for the lifetime of the process and reparsed only
+    when project files or vars change. Parsing itself uses dbt partial
+    parsing, so the state persisted in target/partial_parse.msgpack keeps a
+    fresh process (one per Airflow task) from re-reading the whole project.
+    """
+    global _runner, _runner_key
+    key = (_project_mtime(), json.dumps(dbt_vars, sort_keys=True))
+    if _runner is None or key != _runner_key:
+        dbtRunner = _load_runner_class()
+        start = time.perf_counter()
+        result = dbtRunner().invoke(["parse", "--partial-parse"] + _common_args(dbt_vars))
+        if not result.success:
+            raise RuntimeError(f"dbt parse failed: {result.exception}")
+        print(f"dbt manifest parsed in {time.perf_counter() - start:.1f}s")
+        _runner = dbtRunner(manifest=result.result)
+        _runner_key = key
+    return _runner
+
+
+def _state_dir():
+    return dbt_state_dir or os.path.join(dbt_project_dir, "state")
+
+
+def changed_selection(runner, dbt_vars):
+    """Selection and extra args for the models whose sources got new rows.
+
+    Runs `dbt source freshness` and compares its result with the state saved
+    after the last successful run (`source_status:fresher+`). Falls back to
+    `dbt_select` when there is no comparable state, e.g. on the first run or
+    after the vars changed.
+    """
+    result = runner.invoke(["source", "freshness"] + _common_args(dbt_vars))
+    if not result.success:
+        print(f"dbt source freshness failed, running {dbt_select}: {result.exception}")
+        return dbt_select, []
+
+    state = _state_dir()
+    try:
+        with open(os.path.join(state, "vars.json")) as f:
+            previous_vars = json.load(f)
+    except (OSError, ValueError):
+        previous_vars = None
+    if previous_vars != dbt_vars or not os.path.exists(os.path.join(state, "sources.json")):
+        return dbt_select, []
+    return "source_status:fresher+", ["--state", state]
+
+
+def save_state(dbt_vars):
+    """Keep this run's artifacts as the baseline for the next selection."""
+    state = _state_dir()
+    os.makedirs(state, exist_ok=True)
+    for name in ("sources.json", "manifest.json"):
+        artifact = os.path.join(dbt_project_dir, "target", name)
+        if os.path.exists(artifact):
+            shutil.copyfile(artifact, os.path.join(state, name))
+    with open(os.path.join(state, "vars.json"), "w") as f:
+        json.dump(dbt_vars, f)
+
+
+def run_dbt_models(select=None, mart_materialization="table"):
+    """Run dbt in-process for the models downstream of changed sources.
+
+    With an explicit `select` that selection is run as is; otherwise only
+    models fed by sources that received rows since the last successful run.
+    """
+    dbt_vars = {"mart_materialization": mart_materialization}
+    runner = get_runner(dbt_vars)
+
+    if select:
+        selection, state_args = select, []
+    else:
+        selection, state_args = changed_selection(runner, dbt_vars)
+
+    start = time.perf_counter()
+    result = runner.invoke(
+        ["run", "--partial-parse", "--select", selection] + state_args + _common_args(dbt_vars)
+    )
+    if not result.success:
+        raise RuntimeError(f"dbt run failed: {result.exception}")
+    if not select:
+        save_state(dbt_vars)
+
+    models = [r.node.name for r in result.result] if result.result else []
+    print(f"dbt run built {len(models)} models in {time.perf_counter() - start:.1f}s: {', '.join(models)}")
+    return models
@@ -0,0 +1,214 @@
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from psycopg2.extras import execute_values
+from src.pipelines.api_request import (
+    api_key,
+    fetch_data,
+    get_provider,
+    get_providers,
+    hedged_fetch,
+    ProviderError,
+    QuotaExceededError,
+    ThrottledError,
+    WeatherstackProvider,
+)
+from src.pipelines.payload import PayloadValidationError, payload_get, to_float, to_int
+
+# Load environment variables
+load_dotenv()
+
+forecast_base_url = os.getenv("WEATHER_FORECAST_BASE_URL", "http://api.weatherstack.com/forecast")
+forecast_days = int(os.getenv("WEATHER_FORECAST_DAYS", 3))
+
+# weatherstack error code for endpoints the subscription plan does not include
+FUNCTION_ACCESS_RESTRICTED = 105
+
+
+class ForecastRow(NamedTuple):
+    """One dev.raw_weather_forecast row, fields in INSERT column order."""
+
+    city: str
+    issued_at: datetime
+    valid_time: datetime
+    horizon_hours: int
+    temperature: Optional[float]
+    feelslike: Optional[float]
+    humidity: Optional[int]
+    precip: Optional[float]
+    chance_of_rain: Optional[int]
+    wind_speed: Optional[float]
+    pressure: Optional[int]
+    cloudcover: Optional[int]
+
+
+class WeatherstackForecastProvider(WeatherstackProvider):
+    """weatherstack forecast endpoint; payloads also carry `current`.
+
+    `available` turns False once the API reports that the plan has no
+    forecast access, so later cities skip the request that would fail.
+    """
+
+    name = "weatherstack_forecast"
+
+    def __init__(self, base_url, api_key, timeout=None):
+        super().__init__(base_url, api_key, timeout)
+        self.available = True
+
+    def build_url(self, city):
+        return f"{super().build_url(city)}&forecast_days={forecast_days}&hourly=1"
+
+    def error_message(self, data):
+        error = super().error_message(data)
+        if isinstance(error, dict) and error.get('code') == FUNCTION_ACCESS_RESTRICTED:
+            self.available = False
+        return error
+
+
+_forecast_provider = None
+
+
+def get_forecast_provider():
+    """Forecast provider sharing the weatherstack quota scheduler."""
+    global _forecast_provider
+    if _forecast_provider is None:
+        _forecast_provider = WeatherstackForecastProvider(forecast_base_url, api_key)
+        _forecast_provider.scheduler = get_provider(WeatherstackProvider.name).scheduler
+    return _forecast_provider
+
+
+def fetch_forecast(city, providers=None, hedge=None):
+    """Fetch current conditions plus forecast for a city in one request.
+
+    Uses the configured providers like fetch_data: the forecast endpoint
+    takes the place of a weatherstack primary (hedged against the second
+    provider when WEATHER_HEDGE_ENABLED), and other primaries fetch current
+    conditions only. Falls back to fetch_data when the forecast endpoint
+    fails; after the plan is found to lack forecast access, every later
+    city goes straight to fetch_data.
+    """
+    if providers is None:
+        providers = get_providers()
+    if hedge is None:
+        hedge = os.getenv("WEATHER_HEDGE_ENABLED", "false").lower() == "true"
+
+    if providers[0].name != WeatherstackProvider.name or not get_forecast_provider().available:
+        return fetch_data(city, providers, hedge)
+
+    print(f"Fetching forecast for {city}")
+    try:
+        if hedge and len(providers) > 1:
+            return hedged_fetch(city, get_forecast_provider(), providers[1])
+        return get_forecast_provider().fetch(city)
+    except (QuotaExceededError, ThrottledError):
+        raise
+    except ProviderError as e:
+        print(f"Forecast unavailable for {city}: {e}")
+        return fetch_data(city, providers, hedge)
+
+
+def flatten_forecast(data):
+    """Turn a forecast payload into ForecastRows, one per future hourly step.
+
+    `issued_at` is the local fetch time truncated to the hour, so every run
+    within the same hour upserts the same (city, valid_time, issued_at) rows
+    instead of adding a copy per run.
+    """
+    forecast = payload_get(data, 'forecast')
+    if not isinstance(forecast, dict) or not forecast:
+        return []
+    location = payload_get(data, 'location') or {}
+    city = payload_get(location, 'name')
+    if not city:
+        # city is part of the key (NOT NULL); the observation is still kept
+        raise PayloadValidationError("forecast payload has no location.name")
+    try:
+        fetched_at = datetime.strptime(payload_get(location, 'localtime'), "%Y-%m-%d %H:%M")
+    except (TypeError, ValueError) as e:
+        raise PayloadValidationError(f"forecast payload has no valid location.localtime: {e}") from e
+    issued_at = fetched_at.replace(minute=0)
+
+    rows = []
+    for date, day in forecast.items():
+        try:
+            day_start = datetime.strptime(date, "%Y-%m-%d")
+            for hour in day.get('hourly') or []:
+                step = int(hour.get('time', 0))
+                valid_time = day_start + timedelta(hours=step // 100, minutes=step % 100)
+                if valid_time < issued_at:
+                    continue
+                rows.append(ForecastRow(
+                    city,
+                    issued_at,
+                    valid_time,
+                    int((valid_time - issued_at).total_seconds() // 3600),
+                    to_float(hour.get('temperature')),
+                    to_float(hour.get('feelslike')),
+                    to_int(hour.get('humidity')),
+                    to_float(hour.get('precip')),
+                    to_int(hour.get('chanceofrain')),
+                    to_float(hour.get('wind_speed')),
+                    to_int(hour.get('pressure')),
+                    to_int(hour.get('cloudcover')),
+                ))
+        except (AttributeError, TypeError, ValueError) as e:
+            raise PayloadValidationError(f"invalid forecast for {city} on {date}: {e}") from e
+    return rows
+
+
+def create_forecast_table(conn):
+    print("creating forecast table if not exist")
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE SCHEMA IF NOT EXISTS dev;
+        CREATE TABLE IF NOT EXISTS dev.raw_weather_forecast (
+            city TEXT NOT NULL,
+            issued_at TIMESTAMP NOT NULL,
+            valid_time TIMESTAMP NOT NULL,
+            horizon_hours SMALLINT NOT NULL,
+            temperature REAL,
+            feelslike REAL,
+            humidity SMALLINT,
+            precip REAL,
+            chance_of_rain SMALLINT,
+            wind_speed REAL,
+            pressure SMALLINT,
+            cloudcover SMALLINT,
+            inserted_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (city, valid_time, issued_at)
+        );
+        -- max(inserted_at) for `dbt source freshness`
+        CREATE INDEX IF NOT EXISTS raw_weather_forecast_inserted_at_idx
+            ON dev.raw_weather_forecast (inserted_at);
+    """)
+    conn.commit()
+
+
+def upsert_forecast_rows(conn, rows):
+    """Load forecast rows with one multi-row INSERT ... ON CONFLICT statement.
+
+    The caller commits, together with the chunk's observations.
+    """
+    # A statement may not update the same key twice; keep the last row per key
+    unique = list({(row.city, row.valid_time, row.issued_at): row for row in rows}.values())
+    if not unique:
+        return 0
+    print(f"Upserting {len(unique)} forecast rows")
+    cursor = conn.cursor()
+    execute_values(cursor, f"""
+        INSERT INTO dev.raw_weather_forecast ({', '.join(ForecastRow._fields)})
+        VALUES %s
+        ON CONFLICT (city, valid_time, issued_at) DO UPDATE SET
+            horizon_hours = EXCLUDED.horizon_hours,
+            temperature = EXCLUDED.temperature,
+            feelslike = EXCLUDED.feelslike,
+            humidity = EXCLUDED.humidity,
+            precip = EXCLUDED.precip,
+            chance_of_rain = EXCLUDED.chance_of_rain,
+            wind_speed = EXCLUDED.wind_speed,
+            pressure = EXCLUDED.pressure,
+            cloudcover = EXCLUDED.cloudcover,
+            inserted_at = NOW()
+    """, unique, page_size=len(unique))
+    return len(unique)
@@ -1,16 +1,27 @@
+import heapq
 import os
 import pprint
 import psycopg2
+import resource
+import sys
 import time
+from itertools import islice
 from dotenv import load_dotenv
-from src.pipelines.api_request import mock_fetch_data, fetch_data
+from psycopg2.extras import execute_values
+from src.pipelines.api_request import mock_fetch_data, fetch_data, get_providers, is_fallback, QuotaExceededError
+from src.pipelines.payload import WeatherRecord, PayloadValidationError, record_from_payload
+from src.pipelines.locations import create_locations_table, upsert_locations, upsert_location_queries
+from src.pipelines.quality import create_quality_tables, check_batch, quarantine_records
+from src.pipelines.db_profiling import profiler_from_env
+from src.pipelines.forecast import create_forecast_table, fetch_forecast, flatten_forecast, upsert_forecast_rows
 
 # Load environment variables
 load_dotenv()
 
 # pprint.pprint(mock_fetch_data())
 
-def connect_to_db():
+def connect_to_db(profiler=None):
+    """Connect to the warehouse; with a QueryProfiler every cursor is instrumented."""
 
     print("connecting to database")
  
@@ -20,7 +31,8 @@ def connect_to_db():
             port = int(os.getenv("POSTGRES_PORT", 5432)),
             dbname = os.getenv("POSTGRES_DB", "db"),
             user = os.getenv("POSTGRES_USER", "postgres"),
-            password = os.getenv("POSTGRES_PASSWORD")
+            password = os.getenv("POSTGRES_PASSWORD"),
+            cursor_factory = profiler.cursor_factory() if profiler else None
         )
         return conn
     except psycopg2.Error as e:
@@ -89,6 +101,12 @@ def create_table(conn):
                 -- Metadata
                 inserted_at TIMESTAMP DEFAULT NOW()
             );
+            -- Latest-observation-per-city lookups (marts, nearest-city queries)
+            CREATE INDEX IF NOT EXISTS raw_weather_data_city_inserted_at_idx
+                ON dev.raw_weather_data (city, inserted_at DESC);
+            -- max(inserted_at) for `dbt source freshness`
+            CREATE INDEX IF NOT EXISTS raw_weather_data_inserted_at_idx
+                ON dev.raw_weather_data (inserted_at);
         """)
         conn.commit()
         print("Table was created")
@@ -99,10 +117,8 @@ def create_table(conn):
 def insert_records(conn, data):
     print("Inserting weather data to database")
     try:
-       weather = data['current']
-       location = data['location']
-       astro = weather.get('astro', {})
-       air_quality = weather.get('air_quality', {})
+       # Validate and flatten up front so malformed payloads never reach the DB
+       record = data if isinstance(data, WeatherRecord) else record_from_payload(data)
 
        cursor = conn.cursor()
        cursor.execute("""
@@ -169,90 +185,268 @@ def insert_records(conn, data):
                 %s, %s, %s, %s, %s, %s, %s, %s,
                 NOW()
             )
-        """,(
-            # Location data
-            location.get('name'),
-            location.get('country'),
-            location.get('region'),
-            float(location.get('lat', 0)),
-            float(location.get('lon', 0)),
-            location.get('timezone_id'),
-            location.get('utc_offset'),
-            location.get('localtime'),
-            location.get('localtime_epoch'),
-
-            # Current weather data
-            weather.get('observation_time'),
-            weather.get('temperature'),
-            weather.get('weather_code'),
-            weather.get('weather_descriptions', [''])[0] if weather.get('weather_descriptions') else None,
-            weather.get('weather_icons', [''])[0] if weather.get('weather_icons') else None,
-            weather.get('is_day'),
-
-            # Wind data
-            weather.get('wind_speed'),
-            weather.get('wind_degree'),
-            weather.get('wind_dir'),
-
-            # Atmospheric data
-            weather.get('pressure'),
-            weather.get('precip'),
-            weather.get('humidity'),
-            weather.get('cloudcover'),
-            weather.get('feelslike'),
-            weather.get('uv_index'),
-            weather.get('visibility'),
-
-            # Astronomical data
-            astro.get('sunrise'),
-            astro.get('sunset'),
-            astro.get('moonrise'),
-            astro.get('moonset'),
-            astro.get('moon_phase'),
-            astro.get('moon_illumination'),
-
-            # Air quality data
-            float(air_quality.get('co', 0)) if air_quality.get('co') else None,
-            float(air_quality.get('no2', 0)) if air_quality.get('no2') else None,
-            float(air_quality.get('o3', 0)) if air_quality.get('o3') else None,
-            float(air_quality.get('so2', 0)) if air_quality.get('so2') else None,
-            float(air_quality.get('pm2_5', 0)) if air_quality.get('pm2_5') else None,
-            float(air_quality.get('pm10', 0)) if air_quality.get('pm10') else None,
-            int(air_quality.get('us-epa-index', 0)) if air_quality.get('us-epa-index') else None,
-            int(air_quality.get('gb-defra-index', 0)) if air_quality.get('gb-defra-index') else None
-        ))
+        """, record)
        conn.commit()
        print("data successfully inserted")
     except psycopg2.Error as e:
         print(f"error inserting data to database: {e}")
         raise
 
-def main():
+def insert_records_batch(conn, records):
+    """Insert a list of WeatherRecords with a single multi-row INSERT.
+
+    Does not commit: main() commits each chunk once, after all its writes.
+    """
+    if not records:
+        return 0
+    print(f"Inserting {len(records)} weather records to database")
+    try:
+        cursor = conn.cursor()
+        execute_values(
+            cursor,
+            f"INSERT INTO dev.raw_weather_data ({', '.join(WeatherRecord._fields)}) VALUES %s",
+            records,
+            page_size=len(records)
+        )
+        print("data successfully inserted")
+        return len(records)
+    except psycopg2.Error as e:
+        print(f"error inserting data to database: {e}")
+        raise
+
+def iter_cities():
+    """Yield cities to ingest without loading the whole list into memory.
+
+    Reads WEATHER_CITIES_FILE line by line when set (blank lines and
+    `#` comments are skipped), then the semicolon separated
+    WEATHER_API_CITIES, and otherwise the single WEATHER_API_CITY,
+    defaulting to "New York". Queries such as "Paris, France" keep
+    their commas.
+    """
+    cities_file = os.getenv("WEATHER_CITIES_FILE")
+    if cities_file:
+        with open(cities_file, encoding="utf-8") as f:
+            for line in f:
+                city = line.strip()
+                if city and not city.startswith("#"):
+                    yield city
+        return
+
+    cities = os.getenv("WEATHER_API_CITIES")
+    if cities:
+        for city in cities.split(";"):
+            if city.strip():
+                yield city.strip()
+        return
+
+    yield os.getenv("WEATHER_API_CITY", "New York").strip()
+
+def iter_queries(cities):
+    """Yield query strings from `cities`, unwrapping single-column rows.
+
+    Lets main() consume a database cursor (which yields 1-tuples such as
+    `('London',)`) as well as plain strings.
+    """
+    for city in cities:
+        if isinstance(city, (tuple, list)):
+            city = city[0]
+        yield city
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` items, consuming the iterable lazily."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def load_quota_usage(conn, provider):
+    """Restore this month's request count and quota for provider from the database.
+
+    A configured WEATHER_API_MONTHLY_QUOTA wins; otherwise the quota last
+    learned from rate-limit headers is used, so budgeting works from the
+    start of a run even when only the API reports the quota.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dev.api_quota_usage (
+            provider TEXT,
+            period DATE,
+            requests INT NOT NULL,
+            monthly_quota INT,
+            PRIMARY KEY (provider, period)
+        );
+        ALTER TABLE dev.api_quota_usage ADD COLUMN IF NOT EXISTS monthly_quota INT;
+        SELECT requests, monthly_quota FROM dev.api_quota_usage WHERE provider = %s AND period = %s;
+    """, (provider.name, provider.scheduler.period()))
+    row = cursor.fetchone()
+    if row:
+        requests, quota = row
+        provider.scheduler.used = max(provider.scheduler.used, requests)
+        if provider.scheduler.monthly_quota is None:
+            provider.scheduler.monthly_quota = quota
+    conn.commit()
+
+def save_quota_usage(conn, provider):
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO dev.api_quota_usage (provider, period, requests, monthly_quota) VALUES (%s, %s, %s, %s)
+        ON CONFLICT (provider, period) DO UPDATE SET
+            requests = EXCLUDED.requests,
+            monthly_quota = COALESCE(EXCLUDED.monthly_quota, dev.api_quota_usage.monthly_quota)
+    """, (provider.name, provider.scheduler.period(), provider.scheduler.used,
+          provider.scheduler.monthly_quota))
+    conn.commit()
+
+def select_stalest(conn, cities, budget, chunk_size):
+    """Keep the `budget` cities that were fetched longest ago.
+
+    Cities are matched by their query string (dev.location_queries), not by
+    the location name the API returns, and cities never fetched come first. Staleness is looked up one chunk at a
+    time and only the best `budget` candidates are retained, so memory stays
+    bounded by the budget rather than the length of the city list.
+    """
+    if budget <= 0:
+        return []
+
+    def candidates():
+        position = 0
+        cursor = conn.cursor()
+        for chunk in chunked(cities, chunk_size):
+            cursor.execute("""
+                SELECT query, EXTRACT(EPOCH FROM last_fetched_at)
+                FROM dev.location_queries
+                WHERE query = ANY(%s)
+            """, (chunk,))
+            last_seen = dict(cursor.fetchall())
+            for city in chunk:
+                yield (float(last_seen.get(city) or float("-inf")), position, city)
+                position += 1
+
+    return [city for _, _, city in heapq.nsmallest(budget, candidates())]
+
+def fetch_records(cities, stats, forecasts=None):
+    """Fetch and validate each city, yielding (city, WeatherRecord) one at a time.
+
+    Request pacing is handled by the provider's RateLimitScheduler; fetching
+    stops as soon as the monthly quota is used up. When a `forecasts` list is
+    given, cities are fetched from the forecast endpoint (one request returns
+    both current conditions and forecast) and the flattened ForecastRows are
+    appended to it. The city is None for mock fallback data, which answered
+    no query.
+    """
+    for city in cities:
+        try:
+            print(f"\n--- Processing {city} ---")
+            stats["requested"] += 1
+            data = fetch_data(city) if forecasts is None else fetch_forecast(city)
+            record = record_from_payload(data)
+            if forecasts is not None:
+                try:
+                    forecasts.extend(flatten_forecast(data))
+                except PayloadValidationError as e:
+                    # A bad forecast should not cost us the observation
+                    print(f"Rejected forecast for {city}: {e}")
+            yield (None if is_fallback(data) else city), record
+        except QuotaExceededError as e:
+            print(f"Stopping ingestion, API quota exhausted: {e}")
+            stats["failed"] += 1
+            return
+        except PayloadValidationError as e:
+            print(f"Rejected payload for {city}: {e}")
+            stats["rejected"] += 1
+        except Exception as e:
+            print(f"Error processing {city}: {e}")
+            stats["failed"] += 1
+
+def main(cities=None, chunk_size=None):
+    """Ingest current weather for `cities` (any iterable, default iter_cities()).
+
+    `cities` may hold strings or single-column rows, e.g. an open cursor
+    over `SELECT query FROM ...`.
+
+    Cities are consumed lazily and inserted in chunks of `chunk_size`
+    (WEATHER_CHUNK_SIZE, default 100), so at most one chunk of payloads is
+    held in memory regardless of how many locations are tracked.
+    """
+    cities = iter_cities() if cities is None else iter_queries(cities)
+    if chunk_size is None:
+        chunk_size = int(os.getenv("WEATHER_CHUNK_SIZE", 100))
+
+    # off: no checks, flag: log anomalies but insert them, quarantine: divert them
+    quality_mode = os.getenv("WEATHER_QUALITY_MODE", "flag")
+    # DAG schedule, used to spread the monthly API quota over runs
+    run_interval_minutes = float(os.getenv("WEATHER_RUN_INTERVAL_MINUTES", 5))
+    forecast_enabled = os.getenv("WEATHER_FORECAST_ENABLED", "false").lower() == "true"
+
+    stats = {"requested": 0, "inserted": 0, "rejected": 0, "failed": 0, "chunks": 0,
+             "flagged": 0, "quarantined": 0, "forecast_rows": 0}
+    start = time.perf_counter()
+    profiler = profiler_from_env()
     conn = None
     try:
-        conn = connect_to_db()
+        conn = connect_to_db(profiler)
         create_table(conn)
+        create_locations_table(conn)
+        if quality_mode != "off":
+            create_quality_tables(conn)
+        # Always created: mart_forecast_accuracy reads it even when forecasts are off
+        create_forecast_table(conn)
+        forecasts = [] if forecast_enabled else None
 
-        # Fetch and insert data for each city
-        # Get city from env var, default to "New York"
-        city = os.getenv("WEATHER_API_CITY", "New York")
-        cities = [city]  # Support for single city, can be extended to multiple cities
-        for idx, city in enumerate(cities):
-            try:
-                print(f"\n--- Processing {city} ---")
-                data = fetch_data(city)
-                insert_records(conn, data)
-                print(f"Successfully processed {city}")
+        # Spend only the share of the monthly quota accrued so far, on the
+        # stalest cities first
+        provider = get_providers()[0]
+        load_quota_usage(conn, provider)
+        if provider.scheduler.monthly_quota is not None:
+            budget = provider.scheduler.run_budget(run_interval_minutes)
+            print(f"API quota: {provider.scheduler.monthly_remaining} requests left this month, "
+                  f"budget {budget} for this run")
+            cities = select_stalest(conn, cities, budget, chunk_size)
 
-                # Add delay between API calls to avoid rate limiting (except for last city)
-                if idx < len(cities) - 1:
-                    print("Waiting 3 seconds before next API call...")
-                    time.sleep(3)
+        for fetched in chunked(fetch_records(cities, stats, forecasts), chunk_size):
+            stats["chunks"] += 1
+            records = [record for _, record in fetched]
+            try:
+                # All of a chunk's writes share one transaction, so a failure
+                # anywhere leaves none of them behind
+                flagged = quarantined = forecast_rows = 0
+                if quality_mode != "off":
+                    report = check_batch(conn, records)
+                    flagged = len(report.flagged)
+                    if quality_mode == "quarantine":
+                        quarantined = quarantine_records(conn, report.flagged)
+                        records = report.accepted
+                inserted = insert_records_batch(conn, records)
+                upsert_locations(conn, records)
+                upsert_location_queries(conn, fetched)
+                if forecasts:
+                    # The whole chunk's forecasts go out in one statement
+                    forecast_rows = upsert_forecast_rows(conn, forecasts)
+                conn.commit()
+            except psycopg2.Error as e:
+                print(f"Error processing chunk {stats['chunks']}: {e}")
+                conn.rollback()
+                # The whole chunk was rolled back; carry on with the next one
+                stats["failed"] += len(fetched)
+            else:
+                stats["inserted"] += inserted
+                stats["flagged"] += flagged
+                stats["quarantined"] += quarantined
+                stats["forecast_rows"] += forecast_rows
+            finally:
+                if forecasts:
+                    forecasts.clear()
 
-            except Exception as e:
-                print(f"Error processing {city}: {e}")
-                # Continue with next city even if one fails
-                continue
+        # Also keeps a quota learned from response headers for the next run
+        save_quota_usage(conn, provider)
 
     except Exception as e:
         print(f"error occured during execution: {e}")
@@ -260,3 +454,20 @@ def main():
         if conn:
             conn.close()
             print("Database connection closed")
+        print(
+            f"Run summary: {stats['inserted']}/{stats['requested']} cities inserted, "
+            f"{stats['rejected']} rejected, {stats['flagged']} flagged, "
+            f"{stats['quarantined']} quarantined, {stats['failed']} failed, "
+            f"{stats['forecast_rows']} forecast rows, "
+            f"{stats['chunks']} chunks in {time.perf_counter() - start:.1f}s, "
+            f"peak RSS {peak_rss_mb():.1f} MiB"
+        )
+        if profiler:
+            for entry in profiler.summary()[:5]:
+                print(f"  {entry['total_ms']:.1f} ms in {entry['calls']} calls: {entry['statement'][:100]}")
+            try:
+                profiler.dump(os.getenv("DB_PROFILE_OUTPUT", "db_profile.json"))
+            except OSError as e:
+                # The profile is diagnostics only; never fail a finished ingest over it
+                print(f"Failed to write DB profile: {e}")
+    return stats
@@ -0,0 +1,270 @@
+import heapq
+import math
+import time
+from bisect import bisect_left, bisect_right
+from psycopg2.extras import execute_values
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Columns returned for each nearby city's latest observation
+OBSERVATION_COLUMNS = (
+    "city", "country", "region", "latitude", "longitude",
+    "temperature", "feelslike", "weather_descriptions", "humidity",
+    "wind_speed", "wind_dir", "pressure", "precip", "inserted_at",
+)
+
+
+def location_key(city, country, region):
+    """dim_locations key; display names repeat ("Paris" FR / TX), so all three."""
+    return (city, country or "", region or "")
+
+
+def create_locations_table(conn):
+    """Create the locations dimension with a GiST index on its coordinates.
+
+    Also creates dev.location_queries, which maps each configured query
+    string ("paris,fr", "NYC") to the location name the API resolved it to
+    and records when it was last fetched.
+    """
+    print("creating locations table if not exist")
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE SCHEMA IF NOT EXISTS dev;
+        CREATE TABLE IF NOT EXISTS dev.dim_locations (
+            city TEXT NOT NULL,
+            -- '' when the API gives none, so the key stays NOT NULL
+            country TEXT NOT NULL DEFAULT '',
+            region TEXT NOT NULL DEFAULT '',
+            latitude FLOAT NOT NULL,
+            longitude FLOAT NOT NULL,
+            -- (longitude, latitude), for GiST nearest-neighbour / box queries
+            location POINT NOT NULL,
+            first_seen_at TIMESTAMP DEFAULT NOW(),
+            last_seen_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (city, country, region)
+        );
+        -- Serves observations_in_bbox and ad-hoc `location <-> point` queries
+        CREATE INDEX IF NOT EXISTS dim_locations_location_idx
+            ON dev.dim_locations USING GIST (location);
+        CREATE TABLE IF NOT EXISTS dev.location_queries (
+            query TEXT PRIMARY KEY,
+            city TEXT,
+            last_fetched_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+    conn.commit()
+
+
+def upsert_locations(conn, records):
+    """Register (or move) the location of every WeatherRecord in one statement.
+
+    Like upsert_location_queries, leaves the commit to the caller.
+    """
+    rows = {}
+    for record in records:
+        if record.city and record.latitude is not None and record.longitude is not None:
+            key = location_key(record.city, record.country, record.region)
+            rows[key] = key + (record.latitude, record.longitude)
+    if not rows:
+        return 0
+
+    cursor = conn.cursor()
+    execute_values(cursor, """
+        INSERT INTO dev.dim_locations (city, country, region, latitude, longitude, location)
+        VALUES %s
+        ON CONFLICT (city, country, region) DO UPDATE SET
+            latitude = EXCLUDED.latitude,
+            longitude = EXCLUDED.longitude,
+            location = EXCLUDED.location,
+            last_seen_at = NOW()
+    """, list(rows.values()),
+        template="(%s, %s, %s, %s, %s, point(%s, %s))",
+        page_size=len(rows))
+    return len(rows)
+
+
+def upsert_location_queries(conn, fetched):
+    """Record the location each query resolved to, from (query, WeatherRecord) pairs.
+
+    Pairs without a query (mock fallback data) are skipped, so a failed
+    fetch never counts as a fresh one.
+    """
+    rows = {query: (query, record.city) for query, record in fetched if query is not None}
+    if not rows:
+        return 0
+
+    cursor = conn.cursor()
+    execute_values(cursor, """
+        INSERT INTO dev.location_queries (query, city)
+        VALUES %s
+        ON CONFLICT (query) DO UPDATE SET
+            city = EXCLUDED.city,
+            last_fetched_at = NOW()
+    """, list(rows.values()), page_size=len(rows))
+    return len(rows)
+
+
+def _unit_vector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class KDTree:
+    """k-d tree over 3D points supporting k-nearest-neighbour queries.
+
+    Nodes are `(point index, split axis, left, right)` tuples built by
+    median splits, so the tree is balanced and queries visit O(log n) nodes.
+    """
+
+    def __init__(self, points):
+        self.points = points
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        mid = len(indices) // 2
+        return (indices[mid], axis,
+                self._build(indices[:mid], depth + 1),
+                self._build(indices[mid + 1:], depth + 1))
+
+    def query(self, target, k):
+        """Return [(squared distance, point index)] for the k nearest points."""
+        heap = []  # max-heap via negated distances
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            point = self.points[index]
+            dist2 = ((point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2
+                     + (point[2] - target[2]) ** 2)
+            if len(heap) < k:
+                heapq.heappush(heap, (-dist2, index))
+            elif dist2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-dist2, index))
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far)
+
+        if k > 0:
+            visit(self.root)
+        return sorted((-neg_dist2, index) for neg_dist2, index in heap)
+
+
+class LocationIndex:
+    """In-memory spatial index over tracked locations.
+
+    Each location is a `(label, latitude, longitude)` tuple; lookups return
+    the labels, e.g. dim_locations keys.
+
+    Nearest-city lookups use a k-d tree on unit-sphere coordinates (so
+    distances are great-circle, including across the antimeridian);
+    bounding-box lookups binary-search a latitude-sorted list.
+    """
+
+    def __init__(self, locations):
+        # locations: iterable of (label, latitude, longitude)
+        self.locations = list(locations)
+        self.tree = KDTree([_unit_vector(lat, lon) for _, lat, lon in self.locations])
+        self.by_latitude = sorted(self.locations, key=lambda loc: loc[1])
+        self.latitudes = [loc[1] for loc in self.by_latitude]
+
+    def __len__(self):
+        return len(self.locations)
+
+    def nearest(self, latitude, longitude, k=5):
+        """Return [(label, distance_km)] for the k closest locations."""
+        matches = self.tree.query(_unit_vector(latitude, longitude), k)
+        return [(self.locations[i][0], _chord_to_km(math.sqrt(dist2))) for dist2, i in matches]
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Return labels inside the box; min_lon > max_lon wraps the antimeridian."""
+        start = bisect_left(self.latitudes, min_lat)
+        end = bisect_right(self.latitudes, max_lat)
+        wraps = min_lon > max_lon
+        cities = []
+        for city, _, lon in self.by_latitude[start:end]:
+            inside = (lon >= min_lon or lon <= max_lon) if wraps else (min_lon <= lon <= max_lon)
+            if inside:
+                cities.append(city)
+        return cities
+
+
+# Index shared between queries, rebuilt once it is older than max_age seconds
+_index = None
+_index_built_at = 0.0
+
+
+def get_location_index(conn, max_age=300):
+    """Return the LocationIndex over dev.dim_locations, rebuilding when stale."""
+    global _index, _index_built_at
+    if _index is None or time.monotonic() - _index_built_at > max_age:
+        cursor = conn.cursor()
+        cursor.execute("SELECT city, country, region, latitude, longitude FROM dev.dim_locations")
+        _index = LocationIndex(
+            ((city, country, region), lat, lon) for city, country, region, lat, lon in cursor.fetchall()
+        )
+        _index_built_at = time.monotonic()
+    return _index
+
+
+def latest_observations(conn, keys):
+    """Latest raw_weather_data row per location key, as dicts in the order of `keys`."""
+    keys = [location_key(*key) for key in keys]
+    if not keys:
+        return []
+    cursor = conn.cursor()
+    # The city filter lets the (city, inserted_at DESC) index narrow the scan
+    cursor.execute(f"""
+        SELECT DISTINCT ON (city, COALESCE(country, ''), COALESCE(region, ''))
+            {', '.join(OBSERVATION_COLUMNS)}
+        FROM dev.raw_weather_data
+        WHERE city = ANY(%s)
+          AND (city, COALESCE(country, ''), COALESCE(region, '')) = ANY(%s)
+        ORDER BY city, COALESCE(country, ''), COALESCE(region, ''), inserted_at DESC
+    """, (list({city for city, _, _ in keys}), keys))
+    rows = {}
+    for row in cursor.fetchall():
+        observation = dict(zip(OBSERVATION_COLUMNS, row))
+        rows[location_key(observation["city"], observation["country"], observation["region"])] = observation
+    return [rows[key] for key in keys if key in rows]
+
+
+def nearest_observations(conn, latitude, longitude, k=5):
+    """Latest observations for the k tracked cities nearest to a coordinate."""
+    nearest = get_location_index(conn).nearest(latitude, longitude, k)
+    observations = latest_observations(conn, [key for key, _ in nearest])
+    distances = dict(nearest)
+    for observation in observations:
+        key = location_key(observation["city"], observation["country"], observation["region"])
+        observation["distance_km"] = distances[key]
+    return observations
+
+
+def observations_in_bbox(conn, min_lat, min_lon, max_lat, max_lon):
+    """Latest observations for every tracked city inside a bounding box.
+
+    The box is matched against dim_locations through its GiST index;
+    min_lon > max_lon wraps the antimeridian (searched as two boxes).
+    """
+    if min_lon > max_lon:
+        boxes = [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    else:
+        boxes = [(min_lon, min_lat, max_lon, max_lat)]
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT city, country, region FROM dev.dim_locations WHERE "
+        + " OR ".join(["location <@ box(point(%s, %s), point(%s, %s))"] * len(boxes)),
+        [bound for box in boxes for bound in box]
+    )
+    return latest_observations(conn, cursor.fetchall())
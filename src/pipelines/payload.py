@@ -0,0 +1,344 @@
+"""Decoding and validation of weather payloads into raw_weather_data rows.
+
+With msgspec installed, weatherstack responses are decoded straight into
+typed `Payload` structs: types are checked and coerced by the decoder and
+the flatten into a `WeatherRecord` is a few tuple copies. Otherwise (and
+for payloads that fail the typed decode) JSON is decoded with orjson,
+msgspec or stdlib json into dicts, which `record_from_payload` validates
+field by field. Either way malformed payloads are rejected before they
+reach the database.
+"""
+
+import json
+import math
+import sys
+from typing import Annotated, Any, List, NamedTuple, Optional
+
+_DECODE_ERRORS = (ValueError, TypeError)
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    if msgspec is not None:
+        _loads = msgspec.json.decode
+        _DECODE_ERRORS = (ValueError, TypeError, msgspec.DecodeError)
+        JSON_BACKEND = "msgspec"
+    else:
+        _loads = json.loads
+        JSON_BACKEND = "json"
+
+
+class PayloadValidationError(ValueError):
+    """Raised when a payload does not match the raw_weather_data schema."""
+
+
+class WeatherRecord(NamedTuple):
+    """One raw_weather_data row, fields in INSERT column order."""
+
+    # Location data
+    city: Optional[str]
+    country: Optional[str]
+    region: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    timezone_id: Optional[str]
+    utc_offset: Optional[str]
+    local_time: Optional[str]
+    localtime_epoch: Optional[int]
+
+    # Current weather data
+    observation_time: Optional[str]
+    temperature: Optional[float]
+    weather_code: Optional[int]
+    weather_descriptions: Optional[str]
+    weather_icon_url: Optional[str]
+    is_day: Optional[str]
+
+    # Wind data
+    wind_speed: Optional[float]
+    wind_degree: Optional[int]
+    wind_dir: Optional[str]
+
+    # Atmospheric data
+    pressure: Optional[int]
+    precip: Optional[float]
+    humidity: Optional[int]
+    cloudcover: Optional[int]
+    feelslike: Optional[float]
+    uv_index: Optional[int]
+    visibility: Optional[int]
+
+    # Astronomical data
+    sunrise: Optional[str]
+    sunset: Optional[str]
+    moonrise: Optional[str]
+    moonset: Optional[str]
+    moon_phase: Optional[str]
+    moon_illumination: Optional[int]
+
+    # Air quality data
+    co: Optional[float]
+    no2: Optional[float]
+    o3: Optional[float]
+    so2: Optional[float]
+    pm2_5: Optional[float]
+    pm10: Optional[float]
+    us_epa_index: Optional[int]
+    gb_defra_index: Optional[int]
+
+
+def to_text(value):
+    """Cast a JSON scalar to str (None stays None)."""
+    kind = value.__class__
+    if kind is str or value is None:
+        return value
+    if kind is int or kind is float:
+        return str(value)
+    raise TypeError(f"expected text, got {kind.__name__}")
+
+
+def to_float(value):
+    """Cast a JSON number or numeric string to a finite float; "" is None."""
+    kind = value.__class__
+    if kind is float or kind is int or (kind is str and value):
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(f"non-finite number {value!r}")
+        return number
+    if value is None or kind is str:
+        return None
+    raise TypeError(f"expected number, got {kind.__name__}")
+
+
+def to_int(value):
+    """Cast a JSON number or numeric string to int, rejecting fractions."""
+    kind = value.__class__
+    if kind is int:
+        return value
+    if kind is float or (kind is str and value):
+        number = to_float(value)
+        if not number.is_integer():
+            raise ValueError(f"non-integral value {value!r}")
+        return int(number)
+    if value is None or kind is str:
+        return None
+    raise TypeError(f"expected integer, got {kind.__name__}")
+
+
+def first_text(value):
+    """First element of a JSON list of strings, e.g. weather_descriptions."""
+    if not value:
+        return None
+    if isinstance(value, list):
+        return to_text(value[0])
+    raise TypeError(f"expected list, got {type(value).__name__}")
+
+
+# (section, payload key, caster) for each WeatherRecord field, in order
+_FIELDS = (
+    # Location data
+    ("location", "name", to_text),
+    ("location", "country", to_text),
+    ("location", "region", to_text),
+    ("location", "lat", to_float),
+    ("location", "lon", to_float),
+    ("location", "timezone_id", to_text),
+    ("location", "utc_offset", to_text),
+    ("location", "localtime", to_text),
+    ("location", "localtime_epoch", to_int),
+
+    # Current weather data
+    ("current", "observation_time", to_text),
+    ("current", "temperature", to_float),
+    ("current", "weather_code", to_int),
+    ("current", "weather_descriptions", first_text),
+    ("current", "weather_icons", first_text),
+    ("current", "is_day", to_text),
+
+    # Wind data
+    ("current", "wind_speed", to_float),
+    ("current", "wind_degree", to_int),
+    ("current", "wind_dir", to_text),
+
+    # Atmospheric data
+    ("current", "pressure", to_int),
+    ("current", "precip", to_float),
+    ("current", "humidity", to_int),
+    ("current", "cloudcover", to_int),
+    ("current", "feelslike", to_float),
+    ("current", "uv_index", to_int),
+    ("current", "visibility", to_int),
+
+    # Astronomical data
+    ("astro", "sunrise", to_text),
+    ("astro", "sunset", to_text),
+    ("astro", "moonrise", to_text),
+    ("astro", "moonset", to_text),
+    ("astro", "moon_phase", to_text),
+    ("astro", "moon_illumination", to_int),
+
+    # Air quality data
+    ("air_quality", "co", to_float),
+    ("air_quality", "no2", to_float),
+    ("air_quality", "o3", to_float),
+    ("air_quality", "so2", to_float),
+    ("air_quality", "pm2_5", to_float),
+    ("air_quality", "pm10", to_float),
+    ("air_quality", "us-epa-index", to_int),
+    ("air_quality", "gb-defra-index", to_int),
+)
+
+
+# Dict flatten tables: payload keys per section, and each field's caster
+# with the type that lets a value skip it (to_float always runs, since
+# stdlib json decodes NaN and Infinity to floats)
+_SECTION_KEYS = {
+    section: tuple(key for field_section, key, _ in _FIELDS if field_section == section)
+    for section in ("location", "current", "astro", "air_quality")
+}
+_CASTERS = tuple(cast for _, _, cast in _FIELDS)
+_NATIVE_TYPES = tuple({to_text: str, to_int: int}.get(cast) for cast in _CASTERS)
+
+
+if msgspec is not None:
+    # Typed schema generated from _FIELDS; lax decoding coerces numeric
+    # strings like the casters do, and floats must be finite
+    _FINITE = Annotated[float, msgspec.Meta(ge=-sys.float_info.max, le=sys.float_info.max)]
+    _STRUCT_TYPES = {to_text: str, to_float: _FINITE, to_int: int, first_text: List[str]}
+
+    def _section_struct(name, section, extra=()):
+        fields, rename = [], {}
+        for field_section, key, cast in _FIELDS:
+            if field_section == section:
+                attr = key.replace("-", "_")
+                if attr != key:
+                    rename[attr] = key
+                fields.append((attr, Optional[_STRUCT_TYPES[cast]], None))
+        return msgspec.defstruct(name, fields + list(extra), rename=rename or None)
+
+    _Location = _section_struct("Location", "location")
+    _Astro = _section_struct("Astro", "astro")
+    _AirQuality = _section_struct("AirQuality", "air_quality")
+    _Current = _section_struct("Current", "current", extra=(
+        ("astro", Optional[_Astro], None),
+        ("air_quality", Optional[_AirQuality], None),
+    ))
+
+    class Payload(msgspec.Struct):
+        """A weatherstack response decoded against the raw_weather_data schema."""
+
+        success: Any = None
+        error: Any = None
+        request: Any = None
+        location: Optional[_Location] = None
+        current: Optional[_Current] = None
+        forecast: Any = None
+
+    _payload_decoder = msgspec.json.Decoder(Payload, strict=False)
+    _astuple = msgspec.structs.astuple
+    _NO_ASTRO = _astuple(_Astro())
+    _NO_AIR_QUALITY = _astuple(_AirQuality())
+else:
+    Payload = None
+
+
+def decode_json(raw):
+    """Decode a JSON document (bytes or str) with the fastest available backend."""
+    try:
+        return _loads(raw)
+    except _DECODE_ERRORS as e:
+        raise PayloadValidationError(f"invalid JSON payload: {e}") from e
+
+
+def decode_payload(raw):
+    """Decode a weatherstack response, into a typed `Payload` when possible.
+
+    Falls back to `decode_json` without msgspec or when the typed decode
+    rejects the document, so `record_from_payload` can still report which
+    field is malformed.
+    """
+    if Payload is not None:
+        try:
+            return _payload_decoder.decode(raw)
+        except msgspec.ValidationError:
+            pass
+        except msgspec.DecodeError as e:
+            raise PayloadValidationError(f"invalid JSON payload: {e}") from e
+    return decode_json(raw)
+
+
+def payload_get(data, key, default=None):
+    """Read a top-level payload (or section) entry from a dict or a Payload."""
+    if isinstance(data, dict):
+        return data.get(key, default)
+    return getattr(data, key.replace("-", "_"), default)
+
+
+def _section(data, key):
+    value = data.get(key)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise PayloadValidationError(f"'{key}' must be an object, got {type(value).__name__}")
+    return value
+
+
+def _record_from_struct(data):
+    if data.location is None or data.current is None:
+        raise PayloadValidationError("payload is missing 'location' or 'current'")
+    current = _astuple(data.current)
+    descriptions, icons = current[3], current[4]
+    return WeatherRecord._make(
+        _astuple(data.location)
+        + current[:3]
+        + (descriptions[0] if descriptions else None, icons[0] if icons else None)
+        + current[5:-2]
+        + (_NO_ASTRO if data.current.astro is None else _astuple(data.current.astro))
+        + (_NO_AIR_QUALITY if data.current.air_quality is None else _astuple(data.current.air_quality))
+    )
+
+
+def record_from_payload(data):
+    """Flatten and validate a weatherstack-shaped payload into a WeatherRecord."""
+    if msgspec is not None and isinstance(data, msgspec.Struct):
+        return _record_from_struct(data)
+    if not isinstance(data, dict):
+        raise PayloadValidationError(f"payload must be an object, got {type(data).__name__}")
+    if not isinstance(data.get('location'), dict) or not isinstance(data.get('current'), dict):
+        raise PayloadValidationError("payload is missing 'location' or 'current'")
+
+    current = data['current']
+    sections = {
+        "location": data['location'],
+        "current": current,
+        "astro": _section(current, 'astro'),
+        "air_quality": _section(current, 'air_quality'),
+    }
+
+    values = []
+    for section, keys in _SECTION_KEYS.items():
+        get = sections[section].get
+        values += [get(key) for key in keys]
+    try:
+        # Values that already have the column type skip their caster
+        return WeatherRecord._make([
+            value if value is None or value.__class__ is native else cast(value)
+            for value, native, cast in zip(values, _NATIVE_TYPES, _CASTERS)
+        ])
+    except (TypeError, ValueError):
+        pass
+
+    # Rerun field by field to name the offending field
+    for (section, key, cast), value in zip(_FIELDS, values):
+        try:
+            cast(value)
+        except (TypeError, ValueError) as e:
+            raise PayloadValidationError(f"invalid value for {section}.{key}: {e}") from e
+    raise PayloadValidationError("invalid payload")
@@ -0,0 +1,215 @@
+import os
+import time
+from typing import NamedTuple
+import numpy as np
+from psycopg2.extras import Json, execute_values
+
+# Metrics checked on every observation, with physically plausible bounds
+METRICS = ("temperature", "feelslike", "humidity", "pressure", "wind_speed",
+           "precip", "visibility", "uv_index", "cloudcover")
+LOWER_BOUNDS = np.array([-90.0, -100.0, 0.0, 850.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+UPPER_BOUNDS = np.array([60.0, 70.0, 100.0, 1090.0, 410.0, 500.0, 100.0, 20.0, 100.0])
+
+# Metrics smooth enough for z-score checks (precip, uv, cloud are too spiky)
+ZSCORE_METRICS = np.array([m in ("temperature", "feelslike", "humidity", "pressure", "wind_speed")
+                           for m in METRICS])
+
+# Smallest stddev used in z-scores, so a city with very stable readings is
+# not flagged for ordinary jitter
+STD_FLOOR = np.array([1.0, 1.0, 3.0, 2.0, 3.0, 1.0, 1.0, 1.0, 5.0])
+
+# localtime_epoch is local wall-clock time, up to 14 hours off from UTC
+MAX_UTC_OFFSET = 14 * 3600
+
+z_threshold = float(os.getenv("WEATHER_QUALITY_Z_THRESHOLD", 4))
+# Observations per city before z-scores are trusted
+min_count = int(os.getenv("WEATHER_QUALITY_MIN_COUNT", 12))
+# Statistics cover roughly the last `window` observations (one day at 5 min)
+window = int(os.getenv("WEATHER_QUALITY_WINDOW", 288))
+max_age_hours = float(os.getenv("WEATHER_QUALITY_MAX_AGE_HOURS", 6))
+
+
+class QualityReport(NamedTuple):
+    accepted: list
+    flagged: list  # [(record, [reasons])]
+
+
+class QualityState:
+    """Per-city running mean/variance of each metric, as NumPy arrays.
+
+    Updates are exponentially weighted with weight 1/min(n, window): exact
+    mean/variance for the first `window` observations of a city, then a
+    rolling estimate that follows seasonal drift.
+    """
+
+    def __init__(self, cities=(), count=None, mean=None, var=None):
+        self.cities = list(cities)
+        self.row_of = {city: i for i, city in enumerate(self.cities)}
+        shape = (len(self.cities), len(METRICS))
+        self.count = np.zeros(shape, dtype=np.int64) if count is None else np.asarray(count, dtype=np.int64)
+        self.mean = np.zeros(shape) if mean is None else np.asarray(mean, dtype=float)
+        self.var = np.zeros(shape) if var is None else np.asarray(var, dtype=float)
+
+    def rows(self, cities):
+        """Row index for each city, adding empty rows for unseen cities."""
+        new = [city for city in dict.fromkeys(cities) if city not in self.row_of]
+        if new:
+            for city in new:
+                self.row_of[city] = len(self.cities)
+                self.cities.append(city)
+            empty = np.zeros((len(new), len(METRICS)))
+            self.count = np.vstack([self.count, empty.astype(np.int64)])
+            self.mean = np.vstack([self.mean, empty])
+            self.var = np.vstack([self.var, empty])
+        return np.array([self.row_of[city] for city in cities], dtype=np.intp)
+
+    def update(self, rows, values):
+        """Fold observations (NaN = missing) into the statistics of their rows."""
+        if len(rows) == 0:
+            return
+        # A city can appear more than once per batch; apply its observations
+        # in rounds so every round touches each row at most once
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        starts = np.r_[True, sorted_rows[1:] != sorted_rows[:-1]]
+        group_start = np.maximum.accumulate(np.where(starts, np.arange(len(rows)), 0))
+        rank = np.empty(len(rows), dtype=np.intp)
+        rank[order] = np.arange(len(rows)) - group_start
+
+        for k in range(rank.max() + 1):
+            selected = rank == k
+            r, x = rows[selected], values[selected]
+            valid = ~np.isnan(x)
+            count = self.count[r] + valid
+            weight = np.where(valid, 1.0 / np.maximum(np.minimum(count, window), 1), 0.0)
+            delta = np.where(valid, x - self.mean[r], 0.0)
+            self.mean[r] += weight * delta
+            self.var[r] = (1 - weight) * (self.var[r] + weight * delta ** 2)
+            self.count[r] = count
+
+    @classmethod
+    def load(cls, conn, cities):
+        """Load the statistics of `cities` only, keeping memory per batch."""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT city, count, mean, var
+            FROM dev.weather_quality_state
+            WHERE city = ANY(%s)
+        """, (list(set(cities)),))
+        rows = cursor.fetchall()
+        if not rows:
+            return cls()
+        return cls([row[0] for row in rows], [row[1] for row in rows],
+                   [row[2] for row in rows], [row[3] for row in rows])
+
+    def save(self, conn):
+        rows = [(city, self.count[i].tolist(), self.mean[i].tolist(), self.var[i].tolist())
+                for city, i in self.row_of.items() if city is not None]
+        if not rows:
+            return
+        cursor = conn.cursor()
+        execute_values(cursor, """
+            INSERT INTO dev.weather_quality_state (city, count, mean, var)
+            VALUES %s
+            ON CONFLICT (city) DO UPDATE SET
+                count = EXCLUDED.count,
+                mean = EXCLUDED.mean,
+                var = EXCLUDED.var,
+                updated_at = NOW()
+        """, rows, page_size=len(rows))
+
+
+def create_quality_tables(conn):
+    """Create the per-city statistics store and the quarantine table."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE SCHEMA IF NOT EXISTS dev;
+        CREATE TABLE IF NOT EXISTS dev.weather_quality_state (
+            city TEXT PRIMARY KEY,
+            -- one element per metric, in quality.METRICS order
+            count BIGINT[] NOT NULL,
+            mean DOUBLE PRECISION[] NOT NULL,
+            var DOUBLE PRECISION[] NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+        CREATE TABLE IF NOT EXISTS dev.quarantined_weather_data (
+            id SERIAL PRIMARY KEY,
+            city TEXT,
+            reasons TEXT[],
+            record JSONB,
+            quarantined_at TIMESTAMP DEFAULT NOW()
+        );
+    """)
+    conn.commit()
+
+
+def evaluate_batch(records, state, now=None):
+    """Flag records outside physical bounds, z-score thresholds or too old.
+
+    All checks run on the whole batch at once; the statistics of `state` are
+    then updated with the accepted observations only, so outliers never
+    widen the distribution used to catch them.
+    """
+    if not records:
+        return QualityReport([], [])
+    now = time.time() if now is None else now
+
+    values = np.array([[getattr(record, m) for m in METRICS] for record in records], dtype=float)
+    epochs = np.array([record.localtime_epoch for record in records], dtype=float)
+    rows = state.rows([record.city for record in records])
+
+    with np.errstate(invalid="ignore"):
+        below = values < LOWER_BOUNDS
+        above = values > UPPER_BOUNDS
+        std = np.maximum(np.sqrt(state.var[rows]), STD_FLOOR)
+        z = np.abs(values - state.mean[rows]) / std
+        outlier = (z > z_threshold) & (state.count[rows] >= min_count) & ZSCORE_METRICS
+        stale = (now - epochs > max_age_hours * 3600 + MAX_UTC_OFFSET) | (epochs - now > MAX_UTC_OFFSET + 3600)
+
+    flagged_mask = below.any(axis=1) | above.any(axis=1) | outlier.any(axis=1) | stale
+    state.update(rows[~flagged_mask], values[~flagged_mask])
+
+    accepted, flagged = [], []
+    for i, record in enumerate(records):
+        if not flagged_mask[i]:
+            accepted.append(record)
+            continue
+        reasons = []
+        for j in np.flatnonzero(below[i] | above[i]):
+            reasons.append(f"{METRICS[j]}={values[i, j]:g} outside [{LOWER_BOUNDS[j]:g}, {UPPER_BOUNDS[j]:g}]")
+        for j in np.flatnonzero(outlier[i]):
+            reasons.append(f"{METRICS[j]}={values[i, j]:g} z-score {z[i, j]:.1f}")
+        if stale[i]:
+            reasons.append(f"stale observation (localtime_epoch={record.localtime_epoch})")
+        flagged.append((record, reasons))
+    return QualityReport(accepted, flagged)
+
+
+def check_batch(conn, records):
+    """Evaluate a batch against the stored per-city statistics and persist them.
+
+    The updated statistics are not committed here: they belong to the same
+    transaction as the insert of the batch, so a failed insert rolls them
+    back too.
+    """
+    state = QualityState.load(conn, [record.city for record in records])
+    report = evaluate_batch(records, state)
+    state.save(conn)
+    for record, reasons in report.flagged:
+        print(f"Quality check flagged {record.city}: {'; '.join(reasons)}")
+    return report
+
+
+def quarantine_records(conn, flagged):
+    """Store flagged records, with their reasons, instead of inserting them.
+
+    Like check_batch, leaves the transaction open for the batch insert.
+    """
+    if not flagged:
+        return 0
+    cursor = conn.cursor()
+    execute_values(cursor, """
+        INSERT INTO dev.quarantined_weather_data (city, reasons, record) VALUES %s
+    """, [(record.city, reasons, Json(record._asdict())) for record, reasons in flagged],
+        page_size=len(flagged))
+    return len(flagged)
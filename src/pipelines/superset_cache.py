@@ -0,0 +1,117 @@
+import os
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Superset as reached from the Airflow container
+superset_url = os.getenv("SUPERSET_URL", "http://superset_app:8088")
+superset_username = os.getenv("SUPERSET_ADMIN_USERNAME", "admin")
+superset_password = os.getenv("SUPERSET_ADMIN_PASSWORD", "admin")
+
+# Name of the warehouse database connection inside Superset
+superset_database_name = os.getenv("SUPERSET_DATABASE_NAME", "PostgreSQL")
+
+# Seconds before a Superset API call is abandoned, so a stuck Superset
+# cannot hang the task (warm-up calls run chart queries, hence the margin)
+request_timeout = float(os.getenv("SUPERSET_REQUEST_TIMEOUT", 60))
+
+# Per-dataset cache timeout, aligned with the 5 minute ingestion schedule
+DATASET_CACHE_TIMEOUT = int(os.getenv("SUPERSET_DATA_CACHE_TIMEOUT", 300))
+
+# Datasets backing the dashboards (see create_superset_charts.py)
+MART_DATASETS = [
+    "mart_current_weather",
+    "mart_daily_summary",
+    "mart_air_quality",
+    "mart_weather_trends",
+]
+
+
+def superset_session():
+    """Return a requests session authenticated against the Superset API."""
+    session = requests.Session()
+    response = session.post(f"{superset_url}/api/v1/security/login", json={
+        "username": superset_username,
+        "password": superset_password,
+        "provider": "db",
+        "refresh": True
+    }, timeout=request_timeout)
+    response.raise_for_status()
+    session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    response = session.get(f"{superset_url}/api/v1/security/csrf_token/", timeout=request_timeout)
+    response.raise_for_status()
+    session.headers["X-CSRFToken"] = response.json()["result"]
+    return session
+
+
+def set_dataset_cache_timeout(session, dataset_id, timeout=DATASET_CACHE_TIMEOUT, base_url=None):
+    """Set how long chart results for one dataset stay in the data cache."""
+    response = session.put(f"{base_url or superset_url}/api/v1/dataset/{dataset_id}",
+                           json={"cache_timeout": timeout}, timeout=request_timeout)
+    return response.status_code == 200
+
+
+def ensure_dataset_cache_timeouts(session, datasets, timeout=DATASET_CACHE_TIMEOUT):
+    """Apply `timeout` to the named datasets that do not have it yet.
+
+    Covers datasets created before the timeout was introduced; datasets
+    already configured are left untouched. Returns the number updated.
+    """
+    # Rison query; dataset names are plain identifiers and need no quoting
+    query = (f"(filters:!((col:table_name,opr:in,value:!({','.join(datasets)}))),"
+             f"columns:!(id,table_name,cache_timeout),page_size:100)")
+    response = session.get(f"{superset_url}/api/v1/dataset/", params={"q": query},
+                           timeout=request_timeout)
+    response.raise_for_status()
+
+    updated = 0
+    for dataset in response.json().get("result", []):
+        if dataset.get("cache_timeout") == timeout:
+            continue
+        if set_dataset_cache_timeout(session, dataset["id"], timeout):
+            print(f"Set cache timeout of {dataset['table_name']} to {timeout}s")
+            updated += 1
+        else:
+            print(f"Failed to set cache timeout of {dataset['table_name']}")
+    return updated
+
+
+def warm_up_cache(datasets=None):
+    """Re-run every chart query on `datasets` so dashboards load from cache.
+
+    Meant to run right after the dbt transform. Failures are reported but
+    never fail the pipeline: a cold cache only costs a slower first load.
+    """
+    if os.getenv("SUPERSET_CACHE_WARMUP", "true").lower() != "true":
+        print("Superset cache warm-up disabled")
+        return 0
+
+    datasets = MART_DATASETS if datasets is None else datasets
+    try:
+        session = superset_session()
+    except (requests.RequestException, KeyError) as e:
+        print(f"Superset cache warm-up skipped, login failed: {e}")
+        return 0
+
+    try:
+        ensure_dataset_cache_timeouts(session, datasets)
+    except (requests.RequestException, KeyError, ValueError) as e:
+        print(f"Could not check Superset dataset cache timeouts: {e}")
+
+    warmed = 0
+    for table_name in datasets:
+        try:
+            response = session.put(f"{superset_url}/api/v1/dataset/warm_up_cache", json={
+                "db_name": superset_database_name,
+                "table_name": table_name
+            }, timeout=request_timeout)
+            response.raise_for_status()
+            charts = response.json().get("result", [])
+            print(f"Warmed Superset cache for {table_name} ({len(charts)} charts)")
+            warmed += 1
+        except requests.RequestException as e:
+            print(f"Failed to warm Superset cache for {table_name}: {e}")
+    return warmed
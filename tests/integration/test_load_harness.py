@@ -0,0 +1,110 @@
+"""Integration tests for the load-test harness."""
+
+import pytest
+import shutil
+import subprocess
+from unittest.mock import MagicMock, Mock
+import sys
+import os
+
+# Add project root to path so tests.load and src.pipelines resolve
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from tests.load.fake_weatherstack import FakeWeatherstackServer
+from src.pipelines.api_request import WeatherstackProvider, fetch_data
+from src.pipelines.payload import record_from_payload
+
+
+def postgres_available():
+    """A throwaway cluster can be started, or a server was provided."""
+    if os.getenv('LOADTEST_POSTGRES_DSN'):
+        return True
+    return bool(shutil.which('initdb') or os.getenv('PG_BIN')) and os.geteuid() != 0
+
+
+@pytest.mark.integration
+class TestLoadHarness:
+    """Integration tests for the fake API and the end-to-end harness."""
+
+    def test_fake_weatherstack_payloads_are_valid(self):
+        """Test that fetch_data accepts payloads from the fake server."""
+        with FakeWeatherstackServer() as api:
+            provider = WeatherstackProvider(api.url, 'loadtest')
+            data = fetch_data('Loadtest City 00001', providers=[provider], hedge=False)
+
+        record = record_from_payload(data)
+        assert record.city == 'Loadtest City 00001'
+        assert -90 <= record.latitude <= 90
+        assert api.requests == 1
+
+    def test_fake_weatherstack_errors_fall_back(self):
+        """Test that injected API errors reach the mock fallback."""
+        with FakeWeatherstackServer(error_rate=1.0) as api:
+            provider = WeatherstackProvider(api.url, 'loadtest')
+            data = fetch_data('Loadtest City 00001', providers=[provider], hedge=False)
+
+        assert data['location']['name'] == 'New York'
+
+    @pytest.mark.skipif(not postgres_available(), reason="Requires initdb or LOADTEST_POSTGRES_DSN")
+    def test_short_load_run(self):
+        """Test a short sustained run end to end without dbt."""
+        from tests.load.harness import run_load_test
+
+        report = run_load_test(cities=20, duration=1, chunk_size=8, transform=False)
+
+        assert report['records_inserted'] == 20 * report['runs']
+        assert report['raw_rows_added'] == report['records_inserted']
+        assert report['table_growth_bytes']['raw_weather_data'] > 0
+
+    def test_run_load_test_restores_globals(self, monkeypatch):
+        """Test that the harness leaves no settings behind for later tests."""
+        from tests.load import harness
+        from src.pipelines import api_request, insert_records
+
+        class FakePostgres:
+            params = {'host': '127.0.0.1', 'port': '1', 'dbname': 'db', 'user': 'postgres'}
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                pass
+
+            def connect(self):
+                return MagicMock()
+
+        monkeypatch.setattr(harness, 'LocalPostgres', FakePostgres)
+        monkeypatch.setattr(harness, 'table_stats', lambda conn: {'raw_rows': 0, 'bytes': {}})
+        monkeypatch.setattr(insert_records, 'create_table', Mock())
+        monkeypatch.setattr(insert_records, 'main', Mock(return_value={'inserted': 0}))
+        monkeypatch.setenv('POSTGRES_HOST', 'warehouse')
+        monkeypatch.delenv('POSTGRES_PORT', raising=False)
+        provider = api_request._providers.get('weatherstack')
+
+        harness.run_load_test(cities=1, duration=0, transform=False)
+
+        assert os.environ['POSTGRES_HOST'] == 'warehouse'
+        assert 'POSTGRES_PORT' not in os.environ
+        assert api_request._providers.get('weatherstack') is provider
+
+    def test_failed_cluster_start_cleans_up(self, tmp_path, monkeypatch):
+        """Test that a cluster that fails to start is stopped and removed."""
+        from tests.load import harness
+
+        bin_dir = tmp_path / 'bin'
+        bin_dir.mkdir()
+        for name, status in (('initdb', 0), ('pg_ctl', 1)):
+            script = bin_dir / name
+            script.write_text(f"#!/bin/sh\nexit {status}\n")
+            script.chmod(0o755)
+        monkeypatch.setenv('PG_BIN', str(bin_dir))
+        monkeypatch.delenv('LOADTEST_POSTGRES_DSN', raising=False)
+
+        pg = harness.LocalPostgres()
+        with pytest.raises(subprocess.CalledProcessError):
+            pg.__enter__()
+        assert not os.path.exists(pg.tmp)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
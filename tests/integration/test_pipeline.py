@@ -18,11 +18,11 @@ class TestPipelineIntegration:
     def db_connection(self):
         """Create a test database connection."""
         conn = psycopg2.connect(
-            host='localhost',
-            port=5001,
-            dbname='db',
-            user='postgres',
-            password='postgres'
+            host=os.getenv('POSTGRES_TEST_HOST', 'localhost'),
+            port=int(os.getenv('POSTGRES_TEST_PORT', 5001)),
+            dbname=os.getenv('POSTGRES_TEST_DB', 'db'),
+            user=os.getenv('POSTGRES_TEST_USER', 'postgres'),
+            password=os.getenv('POSTGRES_TEST_PASSWORD', 'postgres')
         )
         yield conn
         conn.close()
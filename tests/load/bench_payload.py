@@ -0,0 +1,63 @@
+"""Micro-benchmark of payload decoding: raw response bytes -> WeatherRecord.
+
+Times each decode path on the fake weatherstack payload and reports the
+best-of-N microseconds per record:
+
+    python -m tests.load.bench_payload --number 20000 --repeat 7
+
+- typed: `decode_payload` into msgspec structs, then `record_from_payload`
+- dict: `decode_json` (orjson, msgspec or json) then the validating flatten
+- flatten: the validating dict flatten alone, on an already decoded payload
+- json: stdlib json plus the dict flatten (the no-optional-dependency path)
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from src.pipelines import payload  # noqa: E402
+from tests.load.fake_weatherstack import fake_payload  # noqa: E402
+
+
+def benchmarks(raw):
+    """Name -> zero-argument callable decoding `raw` into a WeatherRecord."""
+    decoded = json.loads(raw)
+    cases = {
+        "dict": lambda: payload.record_from_payload(payload.decode_json(raw)),
+        "flatten": lambda: payload.record_from_payload(decoded),
+        "json": lambda: payload.record_from_payload(json.loads(raw)),
+    }
+    if payload.Payload is not None:
+        cases["typed"] = lambda: payload.record_from_payload(payload.decode_payload(raw))
+    return cases
+
+
+def run_benchmarks(number=20000, repeat=7):
+    """Best-of-`repeat` microseconds per record for each decode path."""
+    raw = json.dumps(fake_payload("New York")).encode()
+    results = {"json_backend": payload.JSON_BACKEND}
+    for name, case in benchmarks(raw).items():
+        best = min(timeit.repeat(case, number=number, repeat=repeat))
+        results[f"{name}_us"] = round(best / number * 1e6, 2)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="records decoded per timing")
+    parser.add_argument("--repeat", type=int, default=7, help="timings per path (best is kept)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(json.dumps(run_benchmarks(args.number, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
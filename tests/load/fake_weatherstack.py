@@ -0,0 +1,122 @@
+"""Local stand-in for the weatherstack `current` endpoint."""
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_payload(city, now=None):
+    """Plausible weatherstack payload for `city`, stable per city and hour."""
+    now = time.time() if now is None else now
+    seed = zlib.crc32(city.encode())
+    rng = random.Random(seed + int(now // 3600))
+    lat = (seed % 18000) / 100 - 90
+    lon = (seed // 18000 % 36000) / 100 - 180
+    temperature = round(25 - abs(lat) / 3 + rng.uniform(-3, 3))
+    local = time.gmtime(now)
+    return {
+        "request": {"type": "City", "query": city, "language": "en", "unit": "m"},
+        "location": {
+            "name": city,
+            "country": "Loadtestland",
+            "region": "Synthetic",
+            "lat": f"{lat:.3f}",
+            "lon": f"{lon:.3f}",
+            "timezone_id": "UTC",
+            "localtime": time.strftime("%Y-%m-%d %H:%M", local),
+            "localtime_epoch": int(now),
+            "utc_offset": "0.0"
+        },
+        "current": {
+            "observation_time": time.strftime("%I:%M %p", local),
+            "temperature": temperature,
+            "weather_code": 113,
+            "weather_icons": ["https://assets.weatherstack.com/images/wsymbols01_png_64/wsymbol_0001_sunny.png"],
+            "weather_descriptions": ["Sunny"],
+            "astro": {
+                "sunrise": "06:31 AM",
+                "sunset": "05:47 PM",
+                "moonrise": "06:56 AM",
+                "moonset": "06:47 PM",
+                "moon_phase": "Waxing Crescent",
+                "moon_illumination": 0
+            },
+            "air_quality": {
+                "co": f"{rng.uniform(150, 600):.2f}",
+                "no2": f"{rng.uniform(5, 60):.2f}",
+                "o3": f"{rng.uniform(20, 90):.0f}",
+                "so2": f"{rng.uniform(1, 15):.1f}",
+                "pm2_5": f"{rng.uniform(2, 40):.2f}",
+                "pm10": f"{rng.uniform(2, 60):.2f}",
+                "us-epa-index": str(rng.randint(1, 3)),
+                "gb-defra-index": str(rng.randint(1, 3))
+            },
+            "wind_speed": rng.randint(0, 40),
+            "wind_degree": rng.randint(0, 359),
+            "wind_dir": rng.choice(["N", "NE", "E", "SE", "S", "SW", "W", "NW"]),
+            "pressure": rng.randint(995, 1030),
+            "precip": round(rng.uniform(0, 2), 1),
+            "humidity": rng.randint(30, 95),
+            "cloudcover": rng.randint(0, 100),
+            "feelslike": temperature - rng.randint(0, 3),
+            "uv_index": rng.randint(0, 8),
+            "visibility": rng.randint(5, 16),
+            "is_day": "yes"
+        }
+    }
+
+
+class FakeWeatherstackServer:
+    """Threaded HTTP server answering `/current?access_key=..&query=<city>`.
+
+    `latency_ms` delays every response and `error_rate` returns the given
+    share of requests as weatherstack error payloads.
+    """
+
+    def __init__(self, latency_ms=0, error_rate=0.0, host="127.0.0.1", port=0):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                city = query.get("query", ["New York"])[0]
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if random.random() < server.error_rate:
+                    body = {"success": False,
+                            "error": {"code": 615, "type": "request_failed",
+                                      "info": "Your API request failed."}}
+                else:
+                    body = fake_payload(city)
+                encoded = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/current"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,272 @@
+"""End-to-end load test: fake weatherstack -> main() -> Postgres -> dbt marts.
+
+Starts a throwaway Postgres cluster (initdb/pg_ctl from PATH or PG_BIN; must
+not run as root) or uses LOADTEST_POSTGRES_DSN, plus a local fake
+weatherstack server, then drives the ingestion callable at the requested
+city count and request rate for a sustained period, runs the dbt marts and
+reports ingest throughput, transform duration and table growth.
+
+    python -m tests.load.harness --cities 500 --rate 20 --duration 300
+
+The dbt sources point at a database named `db`; the throwaway cluster
+creates it, and a server given through LOADTEST_POSTGRES_DSN must use it.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tests.load.fake_weatherstack import FakeWeatherstackServer  # noqa: E402
+
+DBT_PROJECT_DIR = os.path.join(ROOT, "dbt", "my_project")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalPostgres:
+    """Throwaway Postgres cluster, or an existing server from LOADTEST_POSTGRES_DSN."""
+
+    def __init__(self, dbname="db"):
+        self.dbname = dbname
+        self.params = None
+        self.tmp = None
+
+    def __enter__(self):
+        dsn = os.getenv("LOADTEST_POSTGRES_DSN")
+        if dsn:
+            self.params = psycopg2.extensions.parse_dsn(dsn)
+            return self
+
+        bin_dir = os.getenv("PG_BIN") or os.path.dirname(shutil.which("initdb") or "")
+        if not bin_dir or not os.path.exists(os.path.join(bin_dir, "initdb")):
+            raise RuntimeError("initdb not found: put it on PATH, set PG_BIN or LOADTEST_POSTGRES_DSN")
+
+        self.tmp = tempfile.mkdtemp(prefix="weather-loadtest-")
+        self.data_dir = os.path.join(self.tmp, "data")
+        self.pg_ctl = os.path.join(bin_dir, "pg_ctl")
+        port = _free_port()
+        try:
+            subprocess.run([os.path.join(bin_dir, "initdb"), "-D", self.data_dir, "-U", "postgres",
+                            "-A", "trust", "--no-sync"], check=True, capture_output=True)
+            subprocess.run([self.pg_ctl, "-D", self.data_dir, "-l", os.path.join(self.tmp, "postgres.log"),
+                            "-w", "-o", f"-p {port} -k {self.tmp} -c listen_addresses=127.0.0.1 -c fsync=off",
+                            "start"], check=True, capture_output=True)
+
+            conn = psycopg2.connect(host="127.0.0.1", port=port, dbname="postgres", user="postgres")
+            conn.autocommit = True
+            conn.cursor().execute(f"CREATE DATABASE {self.dbname}")
+            conn.close()
+        except (subprocess.CalledProcessError, psycopg2.Error):
+            # __exit__ is not called when __enter__ fails; stop and remove the cluster here
+            self.__exit__(None, None, None)
+            raise
+        self.params = {"host": "127.0.0.1", "port": str(port), "dbname": self.dbname,
+                       "user": "postgres", "password": ""}
+        return self
+
+    def __exit__(self, *exc):
+        if self.tmp:
+            subprocess.run([self.pg_ctl, "-D", self.data_dir, "-m", "fast", "-w", "stop"],
+                           capture_output=True)
+            shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def connect(self):
+        return psycopg2.connect(**self.params)
+
+
+def table_stats(conn):
+    """Size in bytes of every table/materialized view in dev, plus raw row count."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT c.relname, pg_total_relation_size(c.oid)
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'dev' AND c.relkind IN ('r', 'm')
+        ORDER BY c.relname
+    """)
+    sizes = dict(cursor.fetchall())
+    rows = 0
+    if "raw_weather_data" in sizes:
+        cursor.execute("SELECT COUNT(*) FROM dev.raw_weather_data")
+        rows = cursor.fetchone()[0]
+    conn.commit()
+    return {"raw_rows": rows, "bytes": sizes}
+
+
+def _write_profiles(directory, params):
+    with open(os.path.join(directory, "profiles.yml"), "w") as f:
+        f.write(
+            "my_project:\n"
+            "  outputs:\n"
+            "    dev:\n"
+            "      type: postgres\n"
+            f"      host: {params['host']}\n"
+            f"      port: {int(params.get('port', 5432))}\n"
+            f"      user: {params['user']}\n"
+            f"      pass: \"{params.get('password', '')}\"\n"
+            f"      dbname: {params['dbname']}\n"
+            "      schema: dev\n"
+            "      threads: 4\n"
+            "  target: dev\n"
+        )
+
+
+# Module state run_transform overrides, restored afterwards
+_DBT_RUNNER_GLOBALS = ("dbt_profiles_dir", "dbt_project_dir", "dbt_state_dir", "_runner", "_runner_key")
+
+
+def run_transform(params, mart_materialization):
+    """Run the dbt marts in-process; returns seconds, or None without dbt."""
+    from src.pipelines import dbt_runner
+    try:
+        dbt_runner._load_runner_class()
+    except ImportError:
+        print("dbt is not installed, skipping transform")
+        return None
+
+    saved = {name: getattr(dbt_runner, name) for name in _DBT_RUNNER_GLOBALS}
+    profiles_dir = tempfile.mkdtemp(prefix="weather-loadtest-dbt-")
+    try:
+        _write_profiles(profiles_dir, params)
+        dbt_runner.dbt_profiles_dir = profiles_dir
+        dbt_runner.dbt_project_dir = DBT_PROJECT_DIR
+        # Freshness state belongs to the throwaway database, not the project
+        dbt_runner.dbt_state_dir = os.path.join(profiles_dir, "state")
+        start = time.perf_counter()
+        dbt_runner.run_dbt_models(mart_materialization=mart_materialization)
+        return time.perf_counter() - start
+    finally:
+        for name, value in saved.items():
+            setattr(dbt_runner, name, value)
+        shutil.rmtree(profiles_dir, ignore_errors=True)
+
+
+def run_load_test(cities=100, rate=0, duration=60, chunk_size=100, latency_ms=0,
+                  error_rate=0.0, transform=True, mart_materialization="table"):
+    """Drive repeated ingestion runs for `duration` seconds and report metrics.
+
+    `rate` caps API requests per second (0 = unlimited) through the
+    provider's RateLimitScheduler, exactly as a per-minute quota would.
+    Environment variables and the shared provider it overrides are restored
+    before returning.
+    """
+    from src.pipelines import api_request, insert_records
+
+    with LocalPostgres() as pg, FakeWeatherstackServer(latency_ms, error_rate) as api:
+        overrides = {
+            "POSTGRES_HOST": pg.params["host"],
+            "POSTGRES_PORT": str(pg.params.get("port", 5432)),
+            "POSTGRES_DB": pg.params["dbname"],
+            "POSTGRES_USER": pg.params["user"],
+            "POSTGRES_PASSWORD": pg.params.get("password", ""),
+            "WEATHER_PROVIDERS": "weatherstack",
+            # The forecast endpoint is not faked; never send real requests
+            "WEATHER_FORECAST_ENABLED": "false",
+        }
+        saved_env = {name: os.environ.get(name) for name in overrides}
+        saved_provider = api_request._providers.get(api_request.WeatherstackProvider.name)
+        try:
+            os.environ.update(overrides)
+
+            # Point the shared weatherstack provider at the fake server
+            provider = api_request.WeatherstackProvider(api.url, "loadtest")
+            provider.scheduler = api_request.RateLimitScheduler(per_minute=int(rate * 60) or None)
+            api_request._providers[provider.name] = provider
+
+            city_names = [f"Loadtest City {i:05d}" for i in range(cities)]
+            conn = pg.connect()
+            insert_records.create_table(conn)
+            before = table_stats(conn)
+
+            runs = []
+            start = time.perf_counter()
+            while not runs or time.perf_counter() - start < duration:
+                run_start = time.perf_counter()
+                stats = insert_records.main(cities=iter(city_names), chunk_size=chunk_size)
+                runs.append(dict(stats, seconds=round(time.perf_counter() - run_start, 3)))
+            ingest_seconds = time.perf_counter() - start
+
+            transform_seconds = run_transform(pg.params, mart_materialization) if transform else None
+            after = table_stats(conn)
+            conn.close()
+        finally:
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            if saved_provider is None:
+                api_request._providers.pop(api_request.WeatherstackProvider.name, None)
+            else:
+                api_request._providers[saved_provider.name] = saved_provider
+
+    inserted = sum(run["inserted"] for run in runs)
+    return {
+        "cities": cities,
+        "rate_limit_per_second": rate or None,
+        "runs": len(runs),
+        "api_requests": api.requests,
+        "records_inserted": inserted,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_records_per_second": round(inserted / ingest_seconds, 1) if ingest_seconds else None,
+        "slowest_run_seconds": max(run["seconds"] for run in runs),
+        "transform_seconds": round(transform_seconds, 3) if transform_seconds is not None else None,
+        "raw_rows_added": after["raw_rows"] - before["raw_rows"],
+        "table_growth_bytes": {
+            table: size - before["bytes"].get(table, 0) for table, size in after["bytes"].items()
+        },
+        "run_details": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cities", type=int, default=100, help="tracked cities per run")
+    parser.add_argument("--rate", type=float, default=0, help="max API requests/second (0 = unlimited)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of sustained ingestion")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=0, help="fake API response latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake API errors")
+    parser.add_argument("--no-transform", action="store_true", help="skip the dbt run")
+    parser.add_argument("--mart-materialization", default="table",
+                        choices=["table", "materialized_view"])
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_load_test(
+        cities=args.cities,
+        rate=args.rate,
+        duration=args.duration,
+        chunk_size=args.chunk_size,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        transform=not args.no_transform,
+        mart_materialization=args.mart_materialization,
+    )
+    summary = {k: v for k, v in report.items() if k != "run_details"}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
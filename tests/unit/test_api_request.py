@@ -1,6 +1,8 @@
 """Unit tests for API request module."""
 
 import pytest
+import json
+import time
 from unittest.mock import patch, Mock
 import sys
 import os
@@ -8,7 +10,42 @@ import os
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
 
-from api_request import fetch_data, mock_fetch_data
+import api_request
+from api_request import (
+    fetch_data,
+    mock_fetch_data,
+    hedged_fetch,
+    LatencyTracker,
+    ProviderError,
+    QuotaExceededError,
+    ThrottledError,
+    RateLimitScheduler,
+    WeatherProvider,
+    WeatherAPIProvider,
+    WeatherstackProvider,
+)
+from payload import record_from_payload
+
+
+class StubProvider(WeatherProvider):
+    """Local stand-in provider answering after a fixed delay."""
+
+    def __init__(self, name, delay=0, fail=False):
+        super().__init__("http://stub", "key")
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def build_url(self, city):
+        return f"{self.base_url}?query={city}"
+
+    def fetch(self, city):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ProviderError(f"{self.name} failed")
+        return {"location": {"name": city}, "current": {}, "provider": self.name}
 
 
 class TestAPIRequest:
@@ -40,10 +77,7 @@ class TestAPIRequest:
         """Test successful API fetch."""
         # Mock response
         mock_response = Mock()
-        mock_response.json.return_value = {
-            'location': {'name': 'New York'},
-            'current': {'temperature': 20}
-        }
+        mock_response.content = b'{"location": {"name": "New York"}, "current": {"temperature": 20}}'
         mock_response.raise_for_status = Mock()
         mock_get.return_value = mock_response
 
@@ -51,8 +85,11 @@ class TestAPIRequest:
         result = fetch_data('http://test.com')
 
         assert result is not None
-        assert 'location' in result
-        mock_get.assert_called_once_with('http://test.com')
+        assert record_from_payload(result).city == 'New York'
+        mock_get.assert_called_once_with(
+            f"{api_request.base_url}?access_key={api_request.api_key}&query=http://test.com",
+            timeout=api_request.request_timeout
+        )
 
     @patch('api_request.requests.get')
     def test_fetch_data_failure(self, mock_get):
@@ -64,6 +101,243 @@ class TestAPIRequest:
         with pytest.raises(Exception):
             fetch_data('http://test.com')
 
+    def test_fetch_data_falls_back_to_mock_on_provider_error(self):
+        """Test that provider errors fall back to mock data."""
+        result = fetch_data('New York', providers=[StubProvider('a', fail=True)], hedge=False)
+        assert api_request.is_fallback(result)
+        assert {k: v for k, v in result.items() if k != 'fallback'} == mock_fetch_data('New York')
+        assert not api_request.is_fallback(mock_fetch_data('New York'))
+
+    def test_provider_requires_build_url(self):
+        """Test that providers must implement build_url."""
+        with pytest.raises(TypeError):
+            WeatherProvider("http://stub", "key")
+
+    def test_weatherapi_normalize_matches_weatherstack_shape(self):
+        """Test that weatherapi payloads are normalized to the weatherstack shape."""
+        provider = WeatherAPIProvider("http://stub", "key")
+        result = provider.normalize({
+            'location': {'name': 'Paris', 'country': 'France', 'region': 'Ile-de-France',
+                         'lat': 48.87, 'lon': 2.33, 'tz_id': 'Europe/Paris',
+                         'localtime_epoch': 1736500440, 'localtime': '2025-01-10 10:14'},
+            'current': {'last_updated_epoch': 1736500440, 'temp_c': 5.0, 'is_day': 1,
+                        'condition': {'text': 'Cloudy', 'icon': '//cdn/icon.png', 'code': 1006},
+                        'wind_kph': 9.0, 'pressure_mb': 1020.0, 'humidity': 80,
+                        'uv': 1.3, 'vis_km': 9.4,
+                        'air_quality': {'co': 200.1, 'us-epa-index': 1}}
+        })
+
+        assert set(result) >= set(mock_fetch_data())
+        assert result['location']['timezone_id'] == 'Europe/Paris'
+        assert result['current']['temperature'] == 5.0
+        assert result['current']['weather_descriptions'] == ['Cloudy']
+        assert result['current']['weather_icons'] == ['https://cdn/icon.png']
+        assert result['current']['observation_time'] == '09:14 AM'
+        assert result['current']['is_day'] == 'yes'
+        assert (result['current']['uv_index'], result['current']['visibility']) == (1, 9)
+
+
+class TestHedgedFetch:
+    """Test cases for hedged requests across providers."""
+
+    def test_fast_primary_does_not_hedge(self):
+        """Test that the backup is not called when primary answers in time."""
+        primary, backup = StubProvider('primary'), StubProvider('backup')
+        result = hedged_fetch('Paris', primary, backup, threshold=0.5)
+        assert result['provider'] == 'primary'
+        assert backup.calls == 0
+
+    def test_slow_primary_returns_backup(self):
+        """Test that a slow primary is raced by the backup provider."""
+        primary, backup = StubProvider('primary', delay=0.5), StubProvider('backup')
+        start = time.perf_counter()
+        result = hedged_fetch('Paris', primary, backup, threshold=0.05)
+        assert result['provider'] == 'backup'
+        assert time.perf_counter() - start < 0.4
+
+    def test_failing_primary_fails_over(self):
+        """Test that a primary error triggers the backup immediately."""
+        primary, backup = StubProvider('primary', fail=True), StubProvider('backup')
+        result = hedged_fetch('Paris', primary, backup, threshold=5)
+        assert result['provider'] == 'backup'
+
+    def test_all_providers_failing_raises(self):
+        """Test that an error is raised when every provider fails."""
+        primary = StubProvider('primary', fail=True)
+        backup = StubProvider('backup', fail=True)
+        with pytest.raises(ProviderError):
+            hedged_fetch('Paris', primary, backup, threshold=5)
+
+    def test_latency_tracker_percentile(self):
+        """Test p95 is only reported once enough samples were recorded."""
+        tracker = LatencyTracker(min_samples=20)
+        for i in range(19):
+            tracker.record(i / 100)
+        assert tracker.percentile(95) is None
+        for i in range(19, 100):
+            tracker.record(i / 100)
+        assert tracker.percentile(95) == pytest.approx(0.94)
+
+
+
+class FakeClock:
+    """Deterministic clock whose sleep advances time."""
+
+    def __init__(self, now=1760000000.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimitScheduler:
+    """Test cases for quota-aware request pacing."""
+
+    def test_unlimited_scheduler_never_waits(self):
+        """Test that no pacing happens without a known quota."""
+        clock = FakeClock()
+        scheduler = RateLimitScheduler(clock=clock, sleep=clock.sleep)
+        for _ in range(10):
+            scheduler.acquire()
+        assert clock.slept == []
+        assert scheduler.run_budget(5) is None
+
+    def test_requests_spread_over_minute_quota(self):
+        """Test that requests are spaced to fit the per-minute quota."""
+        clock = FakeClock()
+        scheduler = RateLimitScheduler(per_minute=30, clock=clock, sleep=clock.sleep)
+        for _ in range(4):
+            scheduler.acquire()
+        assert clock.slept == pytest.approx([2.0, 2.0, 2.0])
+
+    def test_rate_limit_headers_adapt_pacing(self):
+        """Test that quota headers replace the configured limits."""
+        clock = FakeClock()
+        scheduler = RateLimitScheduler(clock=clock, sleep=clock.sleep)
+        scheduler.acquire()
+        scheduler.observe(200, {'X-RateLimit-Limit-Minute': '60',
+                                'X-RateLimit-Limit-Month': '1000',
+                                'X-RateLimit-Remaining-Month': '400'}, {})
+        assert scheduler.rate == 60
+        assert scheduler.monthly_remaining == 400
+        assert scheduler.delay() == pytest.approx(1.0)
+
+    def test_throttling_backs_off_and_recovers(self):
+        """Test that 429 halves the rate and successes restore it."""
+        clock = FakeClock()
+        scheduler = RateLimitScheduler(per_minute=20, clock=clock, sleep=clock.sleep)
+        scheduler.acquire()
+        scheduler.observe(429, {'Retry-After': '30'}, {})
+        assert scheduler.rate == 10
+        assert scheduler.delay() == pytest.approx(30.0)
+
+        for _ in range(3):
+            scheduler.observe(200, {}, {})
+        assert scheduler.rate == 16
+
+        for _ in range(5):
+            scheduler.observe(200, {}, {})
+        assert scheduler.rate == 20
+
+    def test_throttling_recovers_without_configured_limit(self):
+        """Test that an unpaced scheduler returns to its pre-throttle rate."""
+        clock = FakeClock()
+        scheduler = RateLimitScheduler(clock=clock, sleep=clock.sleep)
+        for _ in range(10):
+            scheduler.acquire()
+        scheduler.observe(429, {'Retry-After': '5'}, {})
+        assert scheduler.rate == 5
+
+        for _ in range(5):
+            scheduler.observe(200, {}, {})
+        assert scheduler.rate is None
+        clock.now += 5
+        assert scheduler.delay() == 0.0
+
+    def test_error_104_stops_requests(self):
+        """Test that a usage limit error blocks further requests."""
+        clock = FakeClock()
+        scheduler = RateLimitScheduler(monthly_quota=1000, clock=clock, sleep=clock.sleep)
+        scheduler.observe(200, {}, {'success': False, 'error': {'code': 104}})
+        with pytest.raises(QuotaExceededError):
+            scheduler.acquire()
+        assert scheduler.run_budget(5) == 0
+
+    def test_run_budget_spreads_monthly_quota(self):
+        """Test that the budget follows the quota accrued over the month."""
+        # 2025-01-16 12:00 UTC, half way through January
+        clock = FakeClock(1737028800.0)
+        scheduler = RateLimitScheduler(monthly_quota=1000, clock=clock, sleep=clock.sleep)
+        scheduler.used = 490
+        assert scheduler.run_budget(0) == 10
+        scheduler.used = 600
+        assert scheduler.run_budget(0) == 0
+
+    def test_fetch_data_raises_when_quota_exhausted(self):
+        """Test that quota exhaustion is not masked by mock data."""
+        provider = StubProvider('primary')
+        provider.fetch = Mock(side_effect=QuotaExceededError("quota"))
+        with pytest.raises(QuotaExceededError):
+            fetch_data('Paris', providers=[provider], hedge=False)
+
+
+def api_response(status_code, body, headers=None):
+    response = Mock(status_code=status_code, headers=headers or {})
+    response.content = json.dumps(body).encode()
+    response.raise_for_status = Mock()
+    return response
+
+
+class TestQuotaResponses:
+    """Test cases for quota and throttling responses end to end."""
+
+    def provider(self):
+        clock = FakeClock()
+        provider = WeatherstackProvider("http://stub", "key")
+        provider.scheduler = RateLimitScheduler(per_minute=60, clock=clock, sleep=clock.sleep)
+        return provider, clock
+
+    @patch('api_request.requests.get')
+    def test_error_104_raises_quota_error(self, mock_get):
+        """Test that a usage limit response never falls back to mock data."""
+        provider, _ = self.provider()
+        mock_get.return_value = api_response(200, {'success': False, 'error': {'code': 104}})
+
+        with pytest.raises(QuotaExceededError):
+            fetch_data('Tokyo', providers=[provider], hedge=False)
+
+    @patch('api_request.requests.get')
+    def test_throttled_request_retried_after_backoff(self, mock_get):
+        """Test that a 429 waits for Retry-After and fetches the same city again."""
+        provider, clock = self.provider()
+        tokyo = mock_fetch_data()
+        tokyo['location']['name'] = 'Tokyo'
+        mock_get.side_effect = [
+            api_response(429, {'success': False, 'error': {'code': 429}}, {'Retry-After': '20'}),
+            api_response(200, tokyo),
+        ]
+
+        result = fetch_data('Tokyo', providers=[provider], hedge=False)
+
+        assert record_from_payload(result).city == 'Tokyo'
+        assert mock_get.call_count == 2
+        assert clock.slept == pytest.approx([20.0])
+
+    @patch('api_request.requests.get')
+    def test_persistent_throttling_raises(self, mock_get):
+        """Test that throttling beyond the retries is an error, not mock data."""
+        provider, _ = self.provider()
+        mock_get.return_value = api_response(429, {})
+
+        with pytest.raises(ThrottledError):
+            fetch_data('Tokyo', providers=[provider], hedge=False)
+        assert mock_get.call_count == api_request.throttle_retries + 1
+
 
 if __name__ == '__main__':
     pytest.main([__file__])
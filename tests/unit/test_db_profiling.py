@@ -0,0 +1,130 @@
+"""Unit tests for DB query profiling module."""
+
+import pytest
+import json
+import psycopg2
+import psycopg2.extensions
+from unittest.mock import Mock
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
+
+from db_profiling import fingerprint, QueryProfiler, ProfilingCursor, profiler_from_env
+
+
+def mock_cursor(query=b"SELECT 1", rowcount=1, autocommit=False):
+    """Cursor stand-in exposing what the profiler reads."""
+    cursor = Mock()
+    cursor.query = query
+    cursor.rowcount = rowcount
+    cursor.connection.autocommit = autocommit
+    plain = cursor.connection.cursor.return_value
+    plain.fetchone.return_value = ([{"Plan": {"Node Type": "Result"}}],)
+    return cursor
+
+
+class TestFingerprint:
+    """Test cases for statement normalization."""
+
+    def test_literals_normalized(self):
+        """Test that statements differing only in values share a fingerprint."""
+        a = fingerprint("SELECT * FROM t WHERE city = 'Paris' AND id = 3")
+        b = fingerprint(b"SELECT *  FROM t\n WHERE city = 'Rome' AND id = 42")
+        assert a == b
+        assert a[0] == "SELECT * FROM t WHERE city = ? AND id = ?"
+
+    def test_multi_row_values_collapsed(self):
+        """Test that batch sizes do not create new fingerprints."""
+        one = fingerprint("INSERT INTO t (a, b) VALUES (1, 'x')")
+        many = fingerprint("INSERT INTO t (a, b) VALUES (1, 'x'),(2, 'y'), (3, point(1, 2))")
+        assert one[0] == "INSERT INTO t (a, b) VALUES (?, ?)"
+        assert many[0] == "INSERT INTO t (a, b) VALUES (?, ?), ..."
+
+
+class TestQueryProfiler:
+    """Test cases for statement recording and plan sampling."""
+
+    def test_ring_buffer_is_bounded(self):
+        """Test that only the most recent statements are kept."""
+        profiler = QueryProfiler(capacity=3)
+        for i in range(5):
+            profiler.observe(mock_cursor(), f"SELECT {i}", 0.001)
+        assert len(profiler.statements) == 3
+
+    def test_summary_groups_by_fingerprint(self):
+        """Test per-fingerprint totals, slowest first."""
+        profiler = QueryProfiler()
+        profiler.observe(mock_cursor(rowcount=2), "SELECT * FROM a WHERE x = 1", 0.010)
+        profiler.observe(mock_cursor(rowcount=3), "SELECT * FROM a WHERE x = 2", 0.020)
+        profiler.observe(mock_cursor(rowcount=-1), "CREATE TABLE b (x INT)", 0.001)
+
+        summary = profiler.summary()
+
+        assert summary[0]['calls'] == 2
+        assert summary[0]['total_ms'] == pytest.approx(30.0)
+        assert summary[0]['rows'] == 5
+        assert summary[1]['rows'] == 0
+
+    def test_slow_write_explained_inside_savepoint(self):
+        """Test that EXPLAIN ANALYZE of a write is rolled back."""
+        profiler = QueryProfiler(slow_ms=50, explain=True)
+        cursor = mock_cursor(query=b"INSERT INTO t VALUES (1)")
+
+        profiler.observe(cursor, "INSERT INTO t VALUES (%s)", 0.2)
+
+        executed = [c.args[0] for c in cursor.connection.cursor.return_value.execute.call_args_list]
+        assert executed == [
+            "SAVEPOINT query_profiler_explain",
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) INSERT INTO t VALUES (1)",
+            "ROLLBACK TO SAVEPOINT query_profiler_explain",
+        ]
+        assert profiler.explains[0]['plan'] == [{"Plan": {"Node Type": "Result"}}]
+
+    def test_explain_sampled_once_per_fingerprint(self):
+        """Test that repeated slow statements are explained only once."""
+        profiler = QueryProfiler(slow_ms=50, explain=True)
+        for i in range(3):
+            profiler.observe(mock_cursor(query=f"SELECT {i}".encode()), f"SELECT {i}", 0.2)
+        assert len(profiler.explains) == 1
+
+    def test_fast_ddl_and_failed_statements_not_explained(self):
+        """Test that only successful, slow, explainable statements are sampled."""
+        profiler = QueryProfiler(slow_ms=50, explain=True)
+        profiler.observe(mock_cursor(query=b"SELECT 1"), "SELECT 1", 0.001)
+        profiler.observe(mock_cursor(query=b"CREATE TABLE t (x INT)"), "CREATE TABLE t (x INT)", 1.0)
+        profiler.observe(mock_cursor(query=b"SELECT 2"), "SELECT 2", 1.0, error="boom")
+        assert len(profiler.explains) == 0
+
+    def test_dump_writes_json(self, tmp_path):
+        """Test that the profile is dumped as JSON."""
+        profiler = QueryProfiler()
+        profiler.observe(mock_cursor(), "SELECT 1", 0.001)
+        path = tmp_path / "profile.json"
+
+        profiler.dump(str(path))
+
+        report = json.loads(path.read_text())
+        assert set(report) == {"summary", "statements", "explains"}
+        assert report["statements"][0]["statement"] == "SELECT ?"
+
+    def test_cursor_factory_is_bound_cursor_class(self):
+        """Test that the factory yields a psycopg2 cursor subclass."""
+        profiler = QueryProfiler()
+        factory = profiler.cursor_factory()
+        assert issubclass(factory, psycopg2.extensions.cursor)
+        assert issubclass(factory, ProfilingCursor)
+        assert factory.profiler is profiler
+
+    def test_profiler_from_env(self, monkeypatch):
+        """Test that profiling is opt-in."""
+        monkeypatch.delenv('DB_PROFILE', raising=False)
+        assert profiler_from_env() is None
+        monkeypatch.setenv('DB_PROFILE', 'true')
+        monkeypatch.setenv('DB_PROFILE_SLOW_MS', '25')
+        assert profiler_from_env().slow_ms == 25
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,109 @@
+"""Unit tests for in-process dbt runner module."""
+
+import pytest
+from unittest.mock import patch, Mock
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
+
+import dbt_runner
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    """Minimal dbt project layout for manifest invalidation checks."""
+    (tmp_path / 'models').mkdir()
+    (tmp_path / 'models' / 'stg.sql').write_text('select 1')
+    (tmp_path / 'dbt_project.yml').write_text("name: 'my_project'")
+    (tmp_path / 'target').mkdir()
+    (tmp_path / 'target' / 'sources.json').write_text('{}')
+    monkeypatch.setattr(dbt_runner, 'dbt_project_dir', str(tmp_path))
+    monkeypatch.setattr(dbt_runner, 'dbt_state_dir', None)
+    monkeypatch.setattr(dbt_runner, '_runner', None)
+    monkeypatch.setattr(dbt_runner, '_runner_key', None)
+    return tmp_path
+
+
+def fake_runner_class():
+    """dbtRunner stand-in whose invocations always succeed."""
+    runner_cls = Mock()
+    node = Mock()
+    node.node.name = 'mart_current_weather'
+    runner_cls.return_value.invoke.return_value = Mock(success=True, result=[node])
+    return runner_cls
+
+
+class TestDbtRunner:
+    """Test cases for in-process dbt invocation."""
+
+    def test_manifest_parsed_once(self, project_dir):
+        """Test that repeated runs reuse the parsed manifest."""
+        runner_cls = fake_runner_class()
+        with patch('dbt_runner._load_runner_class', return_value=runner_cls):
+            dbt_runner.run_dbt_models()
+            dbt_runner.run_dbt_models()
+
+        invocations = [c.args[0][0] for c in runner_cls.return_value.invoke.call_args_list]
+        assert invocations == ['parse', 'source', 'run', 'source', 'run']
+
+    def test_first_run_selects_downstream_of_raw_tables(self, project_dir):
+        """Test that without saved state every model fed by the raw tables runs."""
+        runner_cls = fake_runner_class()
+        with patch('dbt_runner._load_runner_class', return_value=runner_cls):
+            models = dbt_runner.run_dbt_models()
+
+        run_args = runner_cls.return_value.invoke.call_args_list[-1].args[0]
+        assert run_args[run_args.index('--select') + 1] == dbt_runner.dbt_select
+        assert '--state' not in run_args
+        assert models == ['mart_current_weather']
+        assert (project_dir / 'state' / 'sources.json').exists()
+
+    def test_later_runs_select_fresher_sources(self, project_dir):
+        """Test that saved state narrows the run to changed sources."""
+        runner_cls = fake_runner_class()
+        with patch('dbt_runner._load_runner_class', return_value=runner_cls):
+            dbt_runner.run_dbt_models()
+            dbt_runner.run_dbt_models()
+
+        run_args = runner_cls.return_value.invoke.call_args_list[-1].args[0]
+        assert run_args[run_args.index('--select') + 1] == 'source_status:fresher+'
+        assert run_args[run_args.index('--state') + 1] == str(project_dir / 'state')
+
+    def test_changed_vars_run_everything(self, project_dir):
+        """Test that state saved under other vars is not compared against."""
+        runner_cls = fake_runner_class()
+        with patch('dbt_runner._load_runner_class', return_value=runner_cls):
+            dbt_runner.run_dbt_models(mart_materialization='table')
+            dbt_runner.run_dbt_models(mart_materialization='materialized_view')
+
+        run_args = runner_cls.return_value.invoke.call_args_list[-1].args[0]
+        assert run_args[run_args.index('--select') + 1] == dbt_runner.dbt_select
+
+    def test_manifest_reparsed_when_vars_change(self, project_dir):
+        """Test that a different materialization invalidates the manifest."""
+        runner_cls = fake_runner_class()
+        with patch('dbt_runner._load_runner_class', return_value=runner_cls):
+            dbt_runner.run_dbt_models(mart_materialization='table')
+            dbt_runner.run_dbt_models(mart_materialization='materialized_view')
+
+        invocations = [c.args[0][0] for c in runner_cls.return_value.invoke.call_args_list]
+        assert invocations.count('parse') == 2
+
+    def test_failed_run_raises(self, project_dir):
+        """Test that dbt failures fail the Airflow task."""
+        runner_cls = fake_runner_class()
+        runner_cls.return_value.invoke.side_effect = [
+            Mock(success=True, result=Mock()),
+            Mock(success=True, result=Mock()),
+            Mock(success=False, exception='compilation error'),
+        ]
+        with patch('dbt_runner._load_runner_class', return_value=runner_cls):
+            with pytest.raises(RuntimeError):
+                dbt_runner.run_dbt_models()
+        assert not (project_dir / 'state').exists()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
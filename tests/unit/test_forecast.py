@@ -0,0 +1,201 @@
+"""Unit tests for forecast ingestion module."""
+
+import pytest
+from datetime import datetime
+from unittest.mock import Mock, patch
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
+
+import forecast
+from forecast import (
+    ForecastRow,
+    flatten_forecast,
+    upsert_forecast_rows,
+    PayloadValidationError,
+    ProviderError,
+    QuotaExceededError,
+    WeatherstackForecastProvider,
+)
+
+
+def forecast_payload(localtime="2025-01-10 07:42"):
+    return {
+        "location": {"name": "New York", "localtime": localtime},
+        "current": {"temperature": 5},
+        "forecast": {
+            "2025-01-10": {
+                "date": "2025-01-10",
+                "hourly": [
+                    {"time": "0", "temperature": 1, "humidity": 80},
+                    {"time": "600", "temperature": 2, "humidity": 78},
+                    {"time": "900", "temperature": 4, "humidity": "70", "chanceofrain": "35",
+                     "precip": 0.2, "wind_speed": 12, "pressure": 1012, "cloudcover": 40},
+                ],
+            },
+            "2025-01-11": {
+                "date": "2025-01-11",
+                "hourly": [{"time": "1500", "temperature": "7.5", "feelslike": 6}],
+            },
+        },
+    }
+
+
+def weatherstack():
+    provider = Mock()
+    provider.name = 'weatherstack'
+    return provider
+
+
+class TestFlattenForecast:
+    """Test cases for turning forecast payloads into rows."""
+
+    def test_flatten_hourly_steps(self):
+        """Test valid times, horizons and value coercion."""
+        rows = flatten_forecast(forecast_payload())
+
+        assert [row.valid_time for row in rows] == [
+            datetime(2025, 1, 10, 9), datetime(2025, 1, 11, 15)]
+        assert [row.horizon_hours for row in rows] == [2, 32]
+        assert rows[0] == ForecastRow('New York', datetime(2025, 1, 10, 7), datetime(2025, 1, 10, 9),
+                                      2, 4.0, None, 70, 0.2, 35, 12.0, 1012, 40)
+        assert rows[1].temperature == 7.5
+
+    def test_current_hour_is_kept(self):
+        """Test that the step of the issue hour itself has horizon 0."""
+        rows = flatten_forecast(forecast_payload(localtime="2025-01-10 06:05"))
+        assert rows[0].valid_time == datetime(2025, 1, 10, 6)
+        assert rows[0].horizon_hours == 0
+
+    def test_runs_within_an_hour_share_keys(self):
+        """Test that repeated runs in one hour upsert the same rows."""
+        def keys(localtime):
+            return [(row.city, row.valid_time, row.issued_at)
+                    for row in flatten_forecast(forecast_payload(localtime=localtime))]
+
+        assert keys("2025-01-10 10:05") == keys("2025-01-10 10:10")
+        assert keys("2025-01-10 10:05") != keys("2025-01-10 11:05")
+
+    def test_payload_without_forecast(self):
+        """Test that current-only payloads yield no rows."""
+        assert flatten_forecast({"location": {"name": "New York"}, "current": {}}) == []
+
+    def test_invalid_values_rejected(self):
+        """Test that malformed forecasts raise PayloadValidationError."""
+        payload = forecast_payload()
+        payload["forecast"]["2025-01-11"]["hourly"][0]["temperature"] = {"c": 7}
+        with pytest.raises(PayloadValidationError):
+            flatten_forecast(payload)
+
+        payload = forecast_payload()
+        del payload["location"]["localtime"]
+        with pytest.raises(PayloadValidationError):
+            flatten_forecast(payload)
+
+    def test_missing_city_rejected(self):
+        """Test that rows without a city never reach the NOT NULL key."""
+        payload = forecast_payload()
+        payload["location"]["name"] = None
+        with pytest.raises(PayloadValidationError, match="location.name"):
+            flatten_forecast(payload)
+
+
+class TestUpsertForecastRows:
+    """Test cases for the bulk forecast upsert."""
+
+    @patch('forecast.execute_values')
+    def test_single_statement_with_unique_keys(self, mock_execute_values):
+        """Test that one statement is issued and duplicate keys are collapsed."""
+        conn = Mock()
+        rows = flatten_forecast(forecast_payload())
+        updated = rows[0]._replace(temperature=5.0)
+
+        assert upsert_forecast_rows(conn, rows + [updated]) == 2
+
+        mock_execute_values.assert_called_once()
+        sql, values = mock_execute_values.call_args.args[1:3]
+        assert 'ON CONFLICT (city, valid_time, issued_at) DO UPDATE' in sql
+        assert values == [updated, rows[1]]
+        assert mock_execute_values.call_args.kwargs['page_size'] == 2
+        conn.commit.assert_not_called()
+
+    @patch('forecast.execute_values')
+    def test_empty_rows(self, mock_execute_values):
+        """Test that nothing is sent for an empty batch."""
+        assert upsert_forecast_rows(Mock(), []) == 0
+        mock_execute_values.assert_not_called()
+
+
+class TestFetchForecast:
+    """Test cases for fetching forecasts."""
+
+    def test_build_url(self):
+        """Test that forecast requests ask for hourly steps."""
+        provider = WeatherstackForecastProvider('http://api.weatherstack.com/forecast', 'key')
+        url = provider.build_url('London')
+        assert url.startswith('http://api.weatherstack.com/forecast?access_key=key&query=London')
+        assert f'forecast_days={forecast.forecast_days}' in url
+        assert url.endswith('&hourly=1')
+
+    @patch('forecast.fetch_data')
+    @patch('forecast.get_forecast_provider')
+    def test_falls_back_to_current(self, mock_provider, mock_fetch_data):
+        """Test that a failing forecast endpoint falls back to current conditions."""
+        providers = [weatherstack()]
+        mock_provider.return_value.fetch.side_effect = ProviderError("timed out")
+        mock_fetch_data.return_value = {"current": {}}
+
+        assert forecast.fetch_forecast('London', providers, hedge=False) == {"current": {}}
+        mock_fetch_data.assert_called_once_with('London', providers, False)
+
+    @patch('forecast.fetch_data')
+    @patch('forecast.get_forecast_provider')
+    def test_quota_error_propagates(self, mock_provider, mock_fetch_data):
+        """Test that quota exhaustion is not hidden by the fallback."""
+        mock_provider.return_value.fetch.side_effect = QuotaExceededError("quota")
+
+        with pytest.raises(QuotaExceededError):
+            forecast.fetch_forecast('London', [weatherstack()], hedge=False)
+        mock_fetch_data.assert_not_called()
+
+    @patch('forecast.fetch_data')
+    def test_access_restricted_skips_later_requests(self, mock_fetch_data, monkeypatch):
+        """Test that a plan without forecasts costs one failed request per run."""
+        provider = WeatherstackForecastProvider('http://stub/forecast', 'key')
+        monkeypatch.setattr(forecast, '_forecast_provider', provider)
+
+        def restricted(city):
+            provider.error_message({'success': False, 'error': {'code': 105}})
+            raise ProviderError("function_access_restricted")
+
+        monkeypatch.setattr(provider, 'fetch', Mock(side_effect=restricted))
+
+        forecast.fetch_forecast('London', [weatherstack()], hedge=False)
+        forecast.fetch_forecast('Paris', [weatherstack()], hedge=False)
+
+        assert provider.fetch.call_count == 1
+        assert provider.available is False
+        assert mock_fetch_data.call_count == 2
+
+    @patch('forecast.fetch_data')
+    @patch('forecast.get_forecast_provider')
+    def test_other_primary_fetches_current_only(self, mock_provider, mock_fetch_data):
+        """Test that a non-weatherstack primary provider is used as configured."""
+        providers = [Mock()]
+        providers[0].name = 'weatherapi'
+
+        forecast.fetch_forecast('London', providers, hedge=True)
+
+        mock_provider.return_value.fetch.assert_not_called()
+        mock_fetch_data.assert_called_once_with('London', providers, True)
+
+    @patch('forecast.hedged_fetch')
+    @patch('forecast.get_forecast_provider')
+    def test_hedged_against_backup_provider(self, mock_provider, mock_hedged_fetch):
+        """Test that hedging races the forecast endpoint against the backup."""
+        backup = Mock()
+        forecast.fetch_forecast('London', [weatherstack(), backup], hedge=True)
+
+        mock_hedged_fetch.assert_called_once_with('London', mock_provider.return_value, backup)
@@ -87,5 +87,343 @@ class TestInsertRecords:
         mock_conn.commit.assert_called_once()
 
 
+    @patch('insert_records.execute_values')
+    def test_insert_records_batch(self, mock_execute_values):
+        """Test that a batch is inserted with a single statement."""
+        from insert_records import insert_records_batch
+        from payload import record_from_payload
+        from api_request import mock_fetch_data
+
+        mock_conn = Mock()
+        records = [record_from_payload(mock_fetch_data())] * 3
+
+        assert insert_records_batch(mock_conn, records) == 3
+
+        mock_execute_values.assert_called_once()
+        assert mock_execute_values.call_args.kwargs['page_size'] == 3
+        # main() commits the chunk once, after every write
+        mock_conn.commit.assert_not_called()
+
+    def test_chunked_is_lazy(self):
+        """Test that chunking never pulls more than one chunk ahead."""
+        from insert_records import chunked
+
+        pulled = []
+
+        def cities():
+            for i in range(7):
+                pulled.append(i)
+                yield f"city-{i}"
+
+        chunks = chunked(cities(), 3)
+        assert next(chunks) == ['city-0', 'city-1', 'city-2']
+        assert len(pulled) == 3
+        assert [len(c) for c in chunks] == [3, 1]
+
+    def test_iter_cities_from_file(self, tmp_path, monkeypatch):
+        """Test streaming cities from a file."""
+        from insert_records import iter_cities
+
+        cities_file = tmp_path / "cities.txt"
+        cities_file.write_text("London\n\n# comment\nParis\n")
+        monkeypatch.setenv('WEATHER_CITIES_FILE', str(cities_file))
+
+        assert list(iter_cities()) == ['London', 'Paris']
+
+    def test_iter_cities_from_env(self, monkeypatch):
+        """Test semicolon separated cities from the environment."""
+        from insert_records import iter_cities
+
+        monkeypatch.delenv('WEATHER_CITIES_FILE', raising=False)
+        monkeypatch.setenv('WEATHER_API_CITIES', 'London; Paris, France;')
+
+        assert list(iter_cities()) == ['London', 'Paris, France']
+
+    def test_iter_cities_single_city_keeps_commas(self, monkeypatch):
+        """Test that WEATHER_API_CITY is a single query, commas included."""
+        from insert_records import iter_cities
+
+        monkeypatch.delenv('WEATHER_CITIES_FILE', raising=False)
+        monkeypatch.delenv('WEATHER_API_CITIES', raising=False)
+        monkeypatch.setenv('WEATHER_API_CITY', 'Paris, France')
+
+        assert list(iter_cities()) == ['Paris, France']
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'off'})
+    @patch('insert_records.time.sleep')
+    @patch('insert_records.upsert_location_queries', Mock(return_value=0))
+    @patch('insert_records.upsert_locations')
+    @patch('insert_records.insert_records_batch')
+    @patch('insert_records.fetch_data')
+    @patch('insert_records.connect_to_db')
+    def test_main_processes_cities_in_chunks(self, mock_connect, mock_fetch,
+                                             mock_insert_batch, mock_upsert_locations,
+                                             mock_sleep):
+        """Test that main streams cities through fixed-size chunks."""
+        from insert_records import main
+        from api_request import mock_fetch_data
+
+        mock_fetch.return_value = mock_fetch_data()
+        mock_insert_batch.side_effect = lambda conn, records: len(records)
+
+        stats = main(cities=(f"city-{i}" for i in range(5)), chunk_size=2)
+
+        assert [len(c.args[1]) for c in mock_insert_batch.call_args_list] == [2, 2, 1]
+        assert stats['inserted'] == 5
+        assert stats['chunks'] == 3
+        mock_sleep.assert_not_called()
+        assert mock_upsert_locations.call_count == 3
+        mock_connect.return_value.close.assert_called_once()
+
+    @patch('insert_records.fetch_data')
+    def test_fallback_data_does_not_mark_query_fetched(self, mock_fetch):
+        """Test that mock fallback payloads carry no query for location_queries."""
+        from insert_records import fetch_records
+        from api_request import mock_fetch_data
+
+        fallback = mock_fetch_data()
+        fallback['fallback'] = True
+        mock_fetch.side_effect = [mock_fetch_data(), fallback]
+        stats = {"requested": 0, "rejected": 0, "failed": 0}
+
+        fetched = list(fetch_records(['New York', 'Paris'], stats))
+
+        assert [query for query, _ in fetched] == ['New York', None]
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'off'})
+    @patch('insert_records.upsert_location_queries')
+    @patch('insert_records.upsert_locations', Mock())
+    @patch('insert_records.insert_records_batch')
+    @patch('insert_records.fetch_data')
+    @patch('insert_records.connect_to_db')
+    def test_main_unwraps_cursor_rows(self, mock_connect, mock_fetch,
+                                      mock_insert_batch, mock_upsert_queries):
+        """Test that main accepts a cursor-like iterable of 1-tuples."""
+        from insert_records import main
+        from api_request import mock_fetch_data
+
+        class Cursor:
+            def __iter__(self):
+                return iter([('London',), ('Paris, France',)])
+
+        mock_fetch.return_value = mock_fetch_data()
+        mock_insert_batch.side_effect = lambda conn, records: len(records)
+
+        stats = main(cities=Cursor(), chunk_size=10)
+
+        assert [c.args[0] for c in mock_fetch.call_args_list] == ['London', 'Paris, France']
+        fetched = mock_upsert_queries.call_args.args[1]
+        assert [query for query, _ in fetched] == ['London', 'Paris, France']
+        assert stats['inserted'] == 2
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'off'})
+    @patch('insert_records.time.sleep')
+    @patch('insert_records.insert_records_batch')
+    @patch('insert_records.fetch_data')
+    @patch('insert_records.connect_to_db')
+    def test_main_rejects_malformed_payloads(self, mock_connect, mock_fetch,
+                                             mock_insert_batch, mock_sleep):
+        """Test that malformed payloads are counted and never inserted."""
+        from insert_records import main
+
+        mock_fetch.return_value = {'location': {'name': 'Nowhere'}}
+        mock_insert_batch.side_effect = lambda conn, records: len(records)
+
+        stats = main(cities=['Nowhere'], chunk_size=2)
+
+        mock_insert_batch.assert_not_called()
+        assert stats['rejected'] == 1
+
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'quarantine'})
+    @patch('insert_records.time.sleep')
+    @patch('insert_records.quarantine_records')
+    @patch('insert_records.check_batch')
+    @patch('insert_records.upsert_location_queries', Mock(return_value=0))
+    @patch('insert_records.upsert_locations')
+    @patch('insert_records.insert_records_batch')
+    @patch('insert_records.fetch_data')
+    @patch('insert_records.connect_to_db')
+    def test_main_quarantines_flagged_records(self, mock_connect, mock_fetch, mock_insert_batch,
+                                              mock_upsert_locations, mock_check_batch,
+                                              mock_quarantine, mock_sleep):
+        """Test that quarantine mode only inserts accepted records."""
+        from insert_records import main
+        from api_request import mock_fetch_data
+        from quality import QualityReport
+
+        mock_fetch.return_value = mock_fetch_data()
+        mock_insert_batch.side_effect = lambda conn, records: len(records)
+        mock_check_batch.side_effect = lambda conn, records: QualityReport(
+            records[:1], [(r, ['stale observation']) for r in records[1:]])
+        mock_quarantine.side_effect = lambda conn, flagged: len(flagged)
+
+        stats = main(cities=['a', 'b', 'c'], chunk_size=3)
+
+        assert len(mock_insert_batch.call_args.args[1]) == 1
+        assert stats['inserted'] == 1
+        assert stats['quarantined'] == 2
+
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'off', 'WEATHER_FORECAST_ENABLED': 'true'})
+    @patch('insert_records.time.sleep')
+    @patch('insert_records.upsert_forecast_rows')
+    @patch('insert_records.upsert_location_queries', Mock(return_value=0))
+    @patch('insert_records.upsert_locations')
+    @patch('insert_records.insert_records_batch')
+    @patch('insert_records.fetch_forecast')
+    @patch('insert_records.connect_to_db')
+    def test_main_upserts_forecasts_per_chunk(self, mock_connect, mock_fetch_forecast,
+                                              mock_insert_batch, mock_upsert_locations,
+                                              mock_upsert_forecast, mock_sleep):
+        """Test that each chunk's forecast rows go out in one upsert."""
+        from insert_records import main
+        from api_request import mock_fetch_data
+
+        payload = mock_fetch_data()
+        payload['forecast'] = {'2025-01-10': {'hourly': [{'time': '2100', 'temperature': 18},
+                                                         {'time': '2200', 'temperature': 17}]}}
+        mock_fetch_forecast.return_value = payload
+        mock_insert_batch.side_effect = lambda conn, records: len(records)
+        chunk_sizes = []
+        mock_upsert_forecast.side_effect = lambda conn, rows: chunk_sizes.append(len(rows)) or len(rows)
+
+        stats = main(cities=['a', 'b', 'c'], chunk_size=2)
+
+        assert chunk_sizes == [4, 2]
+        assert stats['forecast_rows'] == 6
+        assert stats['inserted'] == 3
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'off', 'WEATHER_FORECAST_ENABLED': 'true'})
+    @patch('insert_records.upsert_forecast_rows')
+    @patch('insert_records.upsert_location_queries', Mock(return_value=0))
+    @patch('insert_records.upsert_locations', Mock())
+    @patch('insert_records.insert_records_batch')
+    @patch('insert_records.fetch_forecast')
+    @patch('insert_records.connect_to_db')
+    def test_failed_forecast_upsert_rolls_back_chunk(self, mock_connect, mock_fetch_forecast,
+                                                     mock_insert_batch, mock_upsert_forecast):
+        """Test that a chunk commits once, so a failing write undoes all of it."""
+        from insert_records import main
+        from api_request import mock_fetch_data
+        import psycopg2
+
+        payload = mock_fetch_data()
+        payload['forecast'] = {'2025-01-10': {'hourly': [{'time': '2100', 'temperature': 18}]}}
+        mock_fetch_forecast.return_value = payload
+        mock_upsert_forecast.side_effect = psycopg2.Error("forecast upsert failed")
+        mock_conn = mock_connect.return_value
+        commits_before_chunks = []
+        mock_insert_batch.side_effect = (
+            lambda conn, records: commits_before_chunks.append(mock_conn.commit.call_count) or len(records))
+
+        stats = main(cities=['a'], chunk_size=5)
+
+        assert (stats['inserted'], stats['failed']) == (0, 1)
+        mock_conn.rollback.assert_called_once()
+        assert mock_conn.commit.call_count == commits_before_chunks[0]
+
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch('insert_records.fetch_data')
+    @patch('insert_records.connect_to_db')
+    def test_main_survives_profile_write_failure(self, mock_connect, mock_fetch, tmp_path):
+        """Test that an unwritable profile path does not fail the run."""
+        from insert_records import main
+
+        mock_fetch.return_value = {'location': {'name': 'Nowhere'}}
+        with patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'off', 'DB_PROFILE': 'true',
+                                     'DB_PROFILE_OUTPUT': str(tmp_path / 'missing' / 'profile.json')}):
+            stats = main(cities=['Nowhere'], chunk_size=2)
+
+        assert stats['rejected'] == 1
+        assert mock_connect.call_args.args[0] is not None
+
+
+    def test_select_stalest(self):
+        """Test that scarce quota goes to never-seen, then oldest cities."""
+        from insert_records import select_stalest
+
+        mock_conn = Mock()
+        mock_conn.cursor.return_value.fetchall.side_effect = [
+            [('a', 300.0), ('b', 100.0)],
+            [('d', 200.0)],
+        ]
+
+        result = select_stalest(mock_conn, iter(['a', 'b', 'c', 'd']), budget=3, chunk_size=2)
+
+        assert result == ['c', 'b', 'd']
+        assert 'dev.location_queries' in mock_conn.cursor.return_value.execute.call_args.args[0]
+        assert select_stalest(mock_conn, ['a'], budget=0, chunk_size=2) == []
+
+    def test_header_quota_restored_when_unconfigured(self):
+        """Test that a quota learned from headers survives into the next run."""
+        from insert_records import load_quota_usage, save_quota_usage
+        from api_request import RateLimitScheduler
+
+        provider = Mock(scheduler=RateLimitScheduler())
+        provider.name = 'weatherstack'
+        mock_conn = Mock()
+        mock_conn.cursor.return_value.fetchone.return_value = (40, 1000)
+
+        load_quota_usage(mock_conn, provider)
+
+        assert provider.scheduler.used == 40
+        assert provider.scheduler.monthly_quota == 1000
+
+        save_quota_usage(mock_conn, provider)
+        params = mock_conn.cursor.return_value.execute.call_args.args[1]
+        assert params[2:] == (40, 1000)
+
+    def test_configured_quota_wins_over_stored(self):
+        """Test that WEATHER_API_MONTHLY_QUOTA is not replaced by a stored quota."""
+        from insert_records import load_quota_usage
+        from api_request import RateLimitScheduler
+
+        provider = Mock(scheduler=RateLimitScheduler(monthly_quota=500))
+        mock_conn = Mock()
+        mock_conn.cursor.return_value.fetchone.return_value = (40, 1000)
+
+        load_quota_usage(mock_conn, provider)
+
+        assert provider.scheduler.monthly_quota == 500
+
+    @patch('insert_records.save_quota_usage', Mock())
+    @patch('insert_records.load_quota_usage', Mock())
+    @patch.dict(os.environ, {'WEATHER_QUALITY_MODE': 'off'})
+    @patch('insert_records.upsert_location_queries')
+    @patch('insert_records.upsert_locations')
+    @patch('insert_records.insert_records_batch')
+    @patch('insert_records.fetch_data')
+    @patch('insert_records.connect_to_db')
+    def test_main_records_query_strings(self, mock_connect, mock_fetch, mock_insert_batch,
+                                        mock_upsert_locations, mock_upsert_queries):
+        """Test that staleness is tracked by the configured query, not the API name."""
+        from insert_records import main
+        from api_request import mock_fetch_data
+
+        mock_fetch.return_value = mock_fetch_data()
+        mock_insert_batch.side_effect = lambda conn, records: len(records)
+
+        main(cities=['NYC', 'new york,us'], chunk_size=5)
+
+        fetched = mock_upsert_queries.call_args.args[1]
+        assert [(query, record.city) for query, record in fetched] == [
+            ('NYC', 'New York'), ('new york,us', 'New York')]
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
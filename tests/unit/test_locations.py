@@ -0,0 +1,129 @@
+"""Unit tests for locations spatial index module."""
+
+import pytest
+import math
+import random
+from unittest.mock import Mock
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
+
+import locations
+from locations import LocationIndex, EARTH_RADIUS_KM
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Reference great-circle distance."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+CITIES = [
+    ('New York', 40.714, -74.006),
+    ('Newark', 40.735, -74.172),
+    ('Boston', 42.358, -71.060),
+    ('London', 51.507, -0.128),
+    ('Suva', -18.141, 178.441),
+    ('Apia', -13.833, -171.767),
+]
+
+
+class TestLocationIndex:
+    """Test cases for nearest-city and bounding-box lookups."""
+
+    def test_nearest_matches_brute_force(self):
+        """Test k-d tree results against an exhaustive search."""
+        rng = random.Random(7)
+        points = [(f'city-{i}', rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(2000)]
+        index = LocationIndex(points)
+
+        for _ in range(20):
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            expected = sorted(points, key=lambda p: haversine_km(lat, lon, p[1], p[2]))[:5]
+            result = index.nearest(lat, lon, k=5)
+            assert [city for city, _ in result] == [city for city, _, _ in expected]
+            assert result[0][1] == pytest.approx(
+                haversine_km(lat, lon, expected[0][1], expected[0][2]), rel=1e-6)
+
+    def test_nearest_across_antimeridian(self):
+        """Test that distances wrap around longitude 180."""
+        index = LocationIndex(CITIES)
+        assert index.nearest(-16.0, 179.9, k=2)[0][0] == 'Suva'
+        assert [city for city, _ in index.nearest(-15.0, -178.0, k=2)] == ['Suva', 'Apia']
+
+    def test_nearest_k_larger_than_index(self):
+        """Test that k beyond the number of cities returns them all."""
+        assert len(LocationIndex(CITIES).nearest(0, 0, k=50)) == len(CITIES)
+
+    def test_within_bbox(self):
+        """Test bounding-box lookups, including antimeridian wrapping."""
+        index = LocationIndex(CITIES)
+        assert sorted(index.within_bbox(40, -75, 43, -70)) == ['Boston', 'New York', 'Newark']
+        assert sorted(index.within_bbox(-20, 170, -10, -170)) == ['Apia', 'Suva']
+
+
+class TestLocationQueries:
+    """Test cases for observation queries over the index."""
+
+    def test_nearest_observations_ordered_by_distance(self, monkeypatch):
+        """Test that latest observations come back nearest first."""
+        keyed = [((city, 'US', ''), lat, lon) for city, lat, lon in CITIES]
+        monkeypatch.setattr(locations, '_index', LocationIndex(keyed))
+        monkeypatch.setattr(locations, '_index_built_at', float('inf'))
+
+        mock_conn = Mock()
+        cursor = mock_conn.cursor.return_value
+        cursor.fetchall.return_value = [
+            ('Boston', 'US', None) + (None,) * 11,
+            ('New York', 'US', None) + (None,) * 11,
+        ]
+
+        result = locations.nearest_observations(mock_conn, 40.7, -74.0, k=3)
+
+        assert [row['city'] for row in result] == ['New York', 'Boston']
+        assert result[0]['distance_km'] < result[1]['distance_km']
+        assert cursor.execute.call_args.args[1][1] == [
+            ('New York', 'US', ''), ('Newark', 'US', ''), ('Boston', 'US', '')
+        ]
+
+    def test_bbox_across_antimeridian_uses_two_boxes(self):
+        """Test that bounding boxes are matched in SQL, split at longitude 180."""
+        mock_conn = Mock()
+        cursor = mock_conn.cursor.return_value
+        cursor.fetchall.side_effect = [[('Suva', 'Fiji', 'Central')], []]
+
+        locations.observations_in_bbox(mock_conn, -20, 170, -10, -170)
+
+        sql, params = cursor.execute.call_args_list[0].args
+        assert sql.count('location <@ box') == 2
+        assert params == [170, -20, 180.0, -10, -180.0, -20, -170, -10]
+        assert cursor.execute.call_args.args[1][1] == [('Suva', 'Fiji', 'Central')]
+
+    def test_same_name_in_different_countries_kept_apart(self, monkeypatch):
+        """Test that Paris, France and Paris, Texas get separate dim rows."""
+        mock_execute_values = Mock()
+        monkeypatch.setattr(locations, 'execute_values', mock_execute_values)
+        paris_fr = Mock(city='Paris', country='France', region='Ile-de-France',
+                        latitude=48.867, longitude=2.333)
+        paris_tx = Mock(city='Paris', country='United States of America', region='Texas',
+                        latitude=33.661, longitude=-95.556)
+
+        assert locations.upsert_locations(Mock(), [paris_fr, paris_tx]) == 2
+        assert len(mock_execute_values.call_args.args[2]) == 2
+
+    def test_location_queries_skip_fallback_pairs(self, monkeypatch):
+        """Test that pairs without a query (mock fallback data) are not recorded."""
+        mock_execute_values = Mock()
+        monkeypatch.setattr(locations, 'execute_values', mock_execute_values)
+        record = Mock(city='New York')
+
+        assert locations.upsert_location_queries(Mock(), [('NYC', record), (None, record)]) == 1
+        assert mock_execute_values.call_args.args[2] == [('NYC', 'New York')]
+        assert locations.upsert_location_queries(Mock(), [(None, record)]) == 0
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,117 @@
+"""Unit tests for payload decoding and validation module."""
+
+import pytest
+import json
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
+
+from api_request import mock_fetch_data
+import payload
+from payload import (
+    decode_json,
+    decode_payload,
+    payload_get,
+    record_from_payload,
+    PayloadValidationError,
+    WeatherRecord,
+)
+
+
+class TestPayload:
+    """Test cases for payload decoding and validation."""
+
+    def test_record_matches_mock_payload(self):
+        """Test that the mock payload flattens into typed columns."""
+        record = record_from_payload(mock_fetch_data())
+
+        assert isinstance(record, WeatherRecord)
+        assert record.city == 'New York'
+        assert record.latitude == pytest.approx(40.714)
+        assert record.longitude == pytest.approx(-74.006)
+        assert record.weather_descriptions == 'Sunny'
+        assert record.weather_icon_url.endswith('wsymbol_0001_sunny.png')
+        assert record.moon_phase == 'Waxing Crescent'
+        assert record.co == pytest.approx(468.05)
+        assert record.us_epa_index == 1
+        assert record.gb_defra_index == 1
+
+    def test_record_has_one_field_per_column(self):
+        """Test that the record lines up with the INSERT placeholders."""
+        assert len(WeatherRecord._fields) == 39
+
+    def test_decode_json_from_bytes(self):
+        """Test decoding raw JSON bytes into a payload."""
+        raw = json.dumps(mock_fetch_data()).encode()
+        assert record_from_payload(decode_json(raw)) == record_from_payload(mock_fetch_data())
+
+    @pytest.mark.skipif(payload.Payload is None, reason="msgspec not installed")
+    def test_typed_decode_matches_dict_flatten(self):
+        """Test that the typed decode yields the same record as the dict path."""
+        raw = json.dumps(mock_fetch_data()).encode()
+        data = decode_payload(raw)
+
+        assert isinstance(data, payload.Payload)
+        assert record_from_payload(data) == record_from_payload(mock_fetch_data())
+
+    def test_decode_payload_of_error_response(self):
+        """Test that error responses decode and expose their error object."""
+        data = decode_payload(b'{"success": false, "error": {"code": 104}}')
+
+        assert payload_get(data, 'success') is False
+        assert payload_get(data, 'error') == {'code': 104}
+        with pytest.raises(PayloadValidationError):
+            record_from_payload(data)
+
+    def test_integral_floats_accepted(self):
+        """Test that integer columns accept integral floats and strings."""
+        data = mock_fetch_data()
+        data['current']['pressure'] = 1010.0
+        data['current']['humidity'] = '90'
+        record = record_from_payload(data)
+        assert record.pressure == 1010
+        assert record.humidity == 90
+
+    def test_missing_optional_sections(self):
+        """Test that absent astro/air quality sections become NULLs."""
+        record = record_from_payload({
+            'location': {'name': 'New York'},
+            'current': {'temperature': 27, 'weather_descriptions': ['Overcast']}
+        })
+        assert record.temperature == 27.0
+        assert record.sunrise is None
+        assert record.co is None
+
+    def test_invalid_json_rejected(self):
+        """Test that undecodable bytes raise a validation error."""
+        with pytest.raises(PayloadValidationError):
+            decode_json(b'{not json')
+
+    def test_missing_current_rejected(self):
+        """Test that payloads without current conditions are rejected."""
+        with pytest.raises(PayloadValidationError):
+            record_from_payload({'location': {'name': 'New York'}})
+
+    @pytest.mark.parametrize('field, value', [
+        ('temperature', 'warm'),
+        ('humidity', True),
+        ('humidity', 80.6),
+        ('uv_index', '4.5'),
+        ('pressure', {'mb': 1010}),
+        ('wind_speed', 'nan'),
+        ('weather_descriptions', 'Sunny'),
+    ])
+    def test_malformed_values_rejected(self, field, value):
+        """Test that wrongly typed values are rejected."""
+        data = mock_fetch_data()
+        data['current'][field] = value
+        with pytest.raises(PayloadValidationError):
+            record_from_payload(data)
+        with pytest.raises(PayloadValidationError, match=field):
+            record_from_payload(decode_payload(json.dumps(data).encode()))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,124 @@
+"""Unit tests for batch data-quality checks module."""
+
+import pytest
+import time
+import numpy as np
+import sys
+import os
+from unittest.mock import MagicMock, patch
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
+
+from api_request import mock_fetch_data
+from payload import record_from_payload
+from quality import QualityState, check_batch, evaluate_batch, METRICS
+
+NOW = 1736500440.0
+
+
+def make_record(city='New York', **values):
+    """Mock payload record, fresh relative to NOW, with overridden metrics."""
+    data = mock_fetch_data()
+    data['location']['name'] = city
+    data['location']['localtime_epoch'] = int(NOW)
+    data['current'].update(values)
+    return record_from_payload(data)
+
+
+class TestQualityState:
+    """Test cases for incremental per-city statistics."""
+
+    def test_update_matches_batch_statistics(self):
+        """Test that running updates equal NumPy mean/var within the window."""
+        rng = np.random.default_rng(0)
+        values = rng.normal(15, 4, size=(50, len(METRICS)))
+        state = QualityState()
+        rows = state.rows(['a'] * 50)
+
+        state.update(rows, values)
+
+        assert state.count[0, 0] == 50
+        np.testing.assert_allclose(state.mean[0], values.mean(axis=0))
+        np.testing.assert_allclose(state.var[0], values.var(axis=0))
+
+    def test_update_ignores_missing_values(self):
+        """Test that NaNs leave a metric's statistics untouched."""
+        state = QualityState()
+        values = np.full((2, len(METRICS)), np.nan)
+        values[:, 0] = [10.0, 20.0]
+        state.update(state.rows(['a', 'b']), values)
+
+        assert state.count[0].tolist() == [1] + [0] * (len(METRICS) - 1)
+        assert state.mean[1, 0] == 20.0
+
+
+class TestEvaluateBatch:
+    """Test cases for vectorized batch checks."""
+
+    def test_clean_batch_accepted(self):
+        """Test that plausible observations pass."""
+        report = evaluate_batch([make_record(), make_record('Paris')], QualityState(), now=NOW)
+        assert len(report.accepted) == 2
+        assert report.flagged == []
+
+    def test_physical_bounds(self):
+        """Test that impossible values are flagged."""
+        report = evaluate_batch([make_record(humidity=140)], QualityState(), now=NOW)
+        assert report.accepted == []
+        assert 'humidity=140' in report.flagged[0][1][0]
+
+    def test_stale_mock_payload_flagged(self):
+        """Test that the fixed fallback payload is caught as stale."""
+        report = evaluate_batch([record_from_payload(mock_fetch_data())], QualityState(),
+                                now=time.time())
+        assert report.flagged[0][1] == [f"stale observation (localtime_epoch={int(NOW)})"]
+
+    def test_zscore_outlier_flagged(self):
+        """Test that a jump far outside a city's history is flagged."""
+        state = QualityState()
+        rng = np.random.default_rng(1)
+        for temperature in rng.normal(13, 1.5, size=30):
+            evaluate_batch([make_record(temperature=float(temperature))], state, now=NOW)
+
+        report = evaluate_batch([make_record(temperature=45), make_record(temperature=14)],
+                                state, now=NOW)
+
+        assert [r.temperature for r in report.accepted] == [14.0]
+        assert 'temperature=45 z-score' in report.flagged[0][1][0]
+
+    def test_outliers_do_not_update_state(self):
+        """Test that flagged observations are kept out of the statistics."""
+        state = QualityState()
+        evaluate_batch([make_record(temperature=13)], state, now=NOW)
+        evaluate_batch([make_record(temperature=99)], state, now=NOW)
+        assert state.count[0, 0] == 1
+        assert state.mean[0, 0] == 13.0
+
+    def test_ten_thousand_records(self):
+        """Test that a 10k batch is checked quickly."""
+        records = [make_record(f'city-{i}') for i in range(10000)]
+        start = time.perf_counter()
+        report = evaluate_batch(records, QualityState(), now=NOW)
+        assert len(report.accepted) == 10000
+        assert time.perf_counter() - start < 1.0
+
+
+class TestCheckBatch:
+    """Test cases for persisting quality state."""
+
+    @patch('quality.execute_values')
+    def test_state_left_uncommitted_for_insert(self, mock_execute_values):
+        """Test that statistics are saved but committed with the batch insert."""
+        conn = MagicMock()
+        conn.cursor.return_value.fetchall.return_value = []
+
+        report = check_batch(conn, [make_record()])
+
+        assert len(report.accepted) + len(report.flagged) == 1
+        mock_execute_values.assert_called_once()
+        conn.commit.assert_not_called()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,69 @@
+"""Unit tests for Superset cache warm-up module."""
+
+import pytest
+import requests
+from unittest.mock import patch, Mock
+import sys
+import os
+
+# Add src to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/pipelines'))
+
+import superset_cache
+from superset_cache import warm_up_cache, ensure_dataset_cache_timeouts, MART_DATASETS, DATASET_CACHE_TIMEOUT
+
+
+class TestSupersetCache:
+    """Test cases for Superset cache warm-up."""
+
+    @patch('superset_cache.superset_session')
+    def test_warm_up_cache_all_marts(self, mock_session_factory, monkeypatch):
+        """Test that every mart dataset is warmed."""
+        monkeypatch.delenv('SUPERSET_CACHE_WARMUP', raising=False)
+        session = Mock()
+        session.get.return_value.json.return_value = {'result': []}
+        session.put.return_value.json.return_value = {'result': [{'chart_id': 1}]}
+        mock_session_factory.return_value = session
+
+        assert warm_up_cache() == len(MART_DATASETS)
+
+        warmed = [c.kwargs['json']['table_name'] for c in session.put.call_args_list]
+        assert warmed == MART_DATASETS
+        calls = session.get.call_args_list + session.put.call_args_list
+        assert all(c.kwargs['timeout'] == superset_cache.request_timeout for c in calls)
+
+    def test_existing_datasets_get_cache_timeout(self):
+        """Test that only datasets without the timeout are updated."""
+        session = Mock()
+        session.get.return_value.json.return_value = {'result': [
+            {'id': 1, 'table_name': 'mart_current_weather', 'cache_timeout': None},
+            {'id': 2, 'table_name': 'mart_daily_summary', 'cache_timeout': DATASET_CACHE_TIMEOUT},
+        ]}
+        session.put.return_value.status_code = 200
+
+        assert ensure_dataset_cache_timeouts(session, MART_DATASETS) == 1
+
+        assert 'mart_weather_trends' in session.get.call_args.kwargs['params']['q']
+        session.put.assert_called_once()
+        assert session.put.call_args.args[0].endswith('/api/v1/dataset/1')
+        assert session.put.call_args.kwargs['json'] == {'cache_timeout': DATASET_CACHE_TIMEOUT}
+
+    @patch('superset_cache.superset_session')
+    def test_warm_up_cache_login_failure_does_not_raise(self, mock_session_factory, monkeypatch):
+        """Test that an unreachable Superset never fails the pipeline."""
+        monkeypatch.delenv('SUPERSET_CACHE_WARMUP', raising=False)
+        mock_session_factory.side_effect = requests.ConnectionError("refused")
+
+        assert warm_up_cache() == 0
+
+    @patch('superset_cache.superset_session')
+    def test_warm_up_cache_disabled(self, mock_session_factory, monkeypatch):
+        """Test that warm-up can be switched off."""
+        monkeypatch.setenv('SUPERSET_CACHE_WARMUP', 'false')
+
+        assert warm_up_cache() == 0
+        mock_session_factory.assert_not_called()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])